@@ -0,0 +1,77 @@
+# Compare the native schema inference engine with the genson one on large nested payloads.
+#
+#   PYTHONPATH=src python benchmarks/bench_inference.py --items 2000 --depth 4
+import argparse
+import random
+import time
+
+from openapi_generator.core.inference import ENGINE_GENSON, ENGINE_NATIVE
+from openapi_generator.core.openapidoc import OpenAPIDoc
+
+
+def make_record(rng: random.Random, depth: int, width: int):
+    record = {
+        'id': rng.randint(0, 1 << 30),
+        'name': f'name-{rng.random()}',
+        'price': rng.random() * 100,
+        'active': rng.random() > 0.5,
+        'tags': [f'tag{i}' for i in range(rng.randint(1, 5))],
+        'notes': None if rng.random() > 0.5 else 'note',
+    }
+    if depth > 0:
+        record['child'] = make_record(rng, depth - 1, width)
+        record['children'] = [make_record(rng, depth - 1, width) for _ in range(width)]
+    return record
+
+
+def make_payload(items: int, depth: int, width: int, seed: int):
+    rng = random.Random(seed)
+    return {
+        'data': [make_record(rng, depth, width) for _ in range(items)],
+        'pagination': {'page': 1, 'size': items, 'total': items * 10},
+    }
+
+
+def count_nodes(value) -> int:
+    if isinstance(value, dict):
+        return 1 + sum(count_nodes(v) for v in value.values())
+    if isinstance(value, list):
+        return 1 + sum(count_nodes(v) for v in value)
+    return 1
+
+
+def timed(engine: str, payload, repeat: int):
+    best = None
+    schemas = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        schemas = OpenAPIDoc.OpenAPIEndpoint.generate_schemas_from_example('GetBenchResponse', payload, engine)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, schemas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the schema inference engines')
+    parser.add_argument('--items', type=int, default=1000, help='Records in the top level array')
+    parser.add_argument('--depth', type=int, default=3, help='Nesting depth of every record')
+    parser.add_argument('--width', type=int, default=2, help='Children of every nested record')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per engine, the best one is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    payload = make_payload(args.items, args.depth, args.width, args.seed)
+    print(f'payload: {count_nodes(payload)} JSON nodes')
+
+    genson_time, genson_schemas = timed(ENGINE_GENSON, payload, args.repeat)
+    native_time, native_schemas = timed(ENGINE_NATIVE, payload, args.repeat)
+
+    print(f'{ENGINE_GENSON:>8}: {genson_time * 1000:10.1f} ms  {len(genson_schemas)} components')
+    print(f'{ENGINE_NATIVE:>8}: {native_time * 1000:10.1f} ms  {len(native_schemas)} components')
+    print(f' speedup: {genson_time / native_time:10.1f}x')
+    if genson_schemas != native_schemas:
+        raise SystemExit('ERROR: the engines generated different schemas')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+# Time the whole generation and each of its stages on a synthetic collection served by the stand-in API.
+# Every scenario runs in its own process, so that peak RSS is measured for that scenario only.
+#
+#   PYTHONPATH=src python benchmarks/bench_pipeline.py --endpoints 1000 --items 50 --latency 20 --jitter 10
+#   PYTHONPATH=src python benchmarks/bench_pipeline.py --json-out results.json
+#   PYTHONPATH=src python benchmarks/bench_pipeline.py --baseline results.json --tolerance 0.2
+import argparse
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import synthetic
+
+SCENARIOS = ('main', 'stages')
+STANDIN_SERVER = Path(__file__).with_name('standin_server.py')
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    # nearest rank
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+
+def peak_rss() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_main(args) -> Tuple[Dict[str, float], Dict[str, Any]]:
+    import openapi_generator
+
+    metrics_path = args.output.with_suffix('.metrics.json')
+    sys.argv = ['openapi_generator', '-pc', str(args.collection), '-pe', str(args.environment), '-o', str(args.output),
+                '--format', args.format, '--jobs', str(args.jobs), '--max-connections', str(args.max_connections),
+                '--metrics-out', str(metrics_path)]
+    start = time.perf_counter()
+    openapi_generator.main()
+    total = time.perf_counter() - start
+    with open(metrics_path) as f:
+        report = json.load(f)
+    # build and emit overlap with the fetch, they are summed over the endpoints
+    return dict(report['stages'], total=total), report
+
+
+def run_stages(args) -> Tuple[Dict[str, float], Dict[str, Any]]:
+    from openapi_generator.core.metrics import RunMetrics
+    from openapi_generator.core.openapidoc import OpenAPIDoc
+    from openapi_generator.core.options import GenerationOptions
+    from openapi_generator.core.postmanapidoc import PostmanAPIDoc
+
+    metrics = RunMetrics()
+    options = GenerationOptions()
+    timings = {}
+    start = time.perf_counter()
+    postman_doc = PostmanAPIDoc.factory(args.collection, args.environment, limit=args.max_connections,
+                                        metrics=metrics)
+    timings['factory'] = time.perf_counter() - start
+
+    stage_start = time.perf_counter()
+    openapi_doc = OpenAPIDoc.create_from_postman_doc(postman_doc, options)
+    for endpoint in openapi_doc.endpoints:
+        # the write below only emits the fragments built here
+        endpoint.prebuilt = OpenAPIDoc._build_operation_and_endpoint_schemas(endpoint, options)
+    timings['schemas'] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    openapi_doc.write(args.output, args.format)
+    timings['write'] = time.perf_counter() - stage_start
+    timings['total'] = time.perf_counter() - start
+    return timings, metrics.report()
+
+
+def run_child(args):
+    # the generator prints a line for every failed endpoint, they must not mix with the result
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        timings, report = run_main(args) if args.child == 'main' else run_stages(args)
+    finally:
+        sys.stdout = stdout
+    latencies = [endpoint['fetch_seconds'] for endpoint in report['endpoint_metrics'] if not endpoint['failed']]
+    print(json.dumps({
+        'timings': timings,
+        'requests': report['requests'],
+        'retries': report['retries'],
+        'failed': report['failed_endpoints'],
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'peak_rss': peak_rss()
+    }))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, latency: float, jitter: float, max_rps: float) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, str(STANDIN_SERVER), '--port', str(port),
+                               '--latency', str(latency), '--jitter', str(jitter), '--max-rps', str(max_rps)])
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise SystemExit('ERROR: the stand-in server did not start')
+
+
+def run_scenario(args, scenario: str, collection: Path, environment: Path, output: Path) -> Dict[str, Any]:
+    command = [sys.executable, __file__, '--child', scenario, '--collection', str(collection),
+               '--environment', str(environment), '--output', str(output), '--format', args.format,
+               '--jobs', str(args.jobs), '--max-connections', str(args.max_connections)]
+    result = subprocess.run(command, stdout=subprocess.PIPE, check=True, env=dict(os.environ))
+    return json.loads(result.stdout.decode().strip().splitlines()[-1])
+
+
+def report(results: Dict[str, Dict[str, Any]], endpoints: int):
+    print(f'{"scenario":>10} {"total s":>9} {"endp/s":>9} {"p50 ms":>8} {"p99 ms":>8} {"rss MB":>8} {"retries":>8} '
+          f'{"failed":>7}  stages')
+    for scenario, result in results.items():
+        timings = result['timings']
+        stages = '  '.join(f'{name} {value:.3f}s' for name, value in timings.items() if name != 'total')
+        print(f'{scenario:>10} {timings["total"]:9.3f} {endpoints / timings["total"]:9.1f} '
+              f'{result["p50"] * 1000:8.1f} {result["p99"] * 1000:8.1f} {result["peak_rss"] / 2 ** 20:8.1f} '
+              f'{result["retries"]:8} {result["failed"]:7}  {stages}')
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    regressions = []
+    for scenario, result in results.items():
+        if scenario not in baseline:
+            continue
+        for name, value, base_value in (('total', result['timings']['total'], baseline[scenario]['timings']['total']),
+                                        ('peak_rss', result['peak_rss'], baseline[scenario]['peak_rss'])):
+            if value > base_value * (1 + tolerance):
+                regressions.append(f'{scenario} {name}: {value:.3f} against {base_value:.3f} of the baseline')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the generation pipeline against a stand-in API')
+    synthetic.add_arguments(parser)
+    parser.add_argument('--latency', type=float, default=10, help='Milliseconds of latency of the stand-in API')
+    parser.add_argument('--jitter', type=float, default=5, help='Random milliseconds added to the latency')
+    parser.add_argument('--max-rps', type=float, default=0, help='Rate above which the stand-in API answers 429')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per scenario, the median one is reported')
+    parser.add_argument('--format', default='yaml')
+    parser.add_argument('--jobs', type=int, default=1)
+    parser.add_argument('--max-connections', type=int, default=100)
+    parser.add_argument('--json-out', type=Path, help='File the results are saved to')
+    parser.add_argument('--baseline', type=Path, help='Results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Slowdown or memory growth accepted')
+    # used by the scenario processes
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--collection', type=Path, help=argparse.SUPPRESS)
+    parser.add_argument('--environment', type=Path, help=argparse.SUPPRESS)
+    parser.add_argument('--output', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    port = free_port()
+    server = start_server(port, args.latency, args.jitter, args.max_rps)
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            collection, environment = synthetic.write_collection(directory,
+                                                                 endpoints=args.endpoints,
+                                                                 depth=args.depth,
+                                                                 fanout=args.fanout,
+                                                                 shape=args.shape,
+                                                                 items=args.items,
+                                                                 auth_header=args.auth_header,
+                                                                 base_url=f'http://127.0.0.1:{port}',
+                                                                 seed=args.seed)
+            for scenario in args.scenarios:
+                runs = [run_scenario(args, scenario, collection, environment, directory / f'{scenario}.{args.format}')
+                        for _ in range(args.repeat)]
+                median_total = statistics.median_low(run['timings']['total'] for run in runs)
+                results[scenario] = next(run for run in runs if run['timings']['total'] == median_total)
+    finally:
+        server.terminate()
+        server.wait()
+
+    report(results, args.endpoints)
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# Check that the deadline of a run bounds the work it does: once it fires, the run ends in time, no request task
+# of the client is left running, retrying or reconnecting, and the service sees every slow request dropped. The
+# collection mixes fast endpoints with slow ones, several of them the same request so that they are coalesced.
+#
+#   PYTHONPATH=src python benchmarks/check_deadline.py
+#   PYTHONPATH=src python benchmarks/check_deadline.py --deadline 0.5 --latency 5000
+import argparse
+import asyncio
+import contextlib
+import copy
+import io
+import json
+import logging
+import random
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+import synthetic
+from standin_server import create_app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def write_collection(output_dir: Path, port: int, endpoints: int, duplicates: int, latency: float):
+    # every other endpoint answers after latency ms, and each slow GET is repeated duplicates times
+    collection, environment = synthetic.make_collection(endpoints=0, base_url=f'http://127.0.0.1:{port}')
+    items = []
+    for index in range(endpoints):
+        item = synthetic.make_item(index, random.Random(index), 'flat', 5)
+        slow = index % 2 == 1
+        item['request']['url']['query'].append({'key': 'latency', 'value': str(latency if slow else 0)})
+        items.append(item)
+        if slow and item['request']['method'] == 'GET':
+            for copy_index in range(duplicates):
+                duplicate = copy.deepcopy(item)
+                duplicate['name'] = f'{item["name"]}Copy{copy_index}'
+                items.append(duplicate)
+    collection['item'] = items
+    collection_path = output_dir / 'collection.json'
+    environment_path = output_dir / 'environment.json'
+    with open(collection_path, 'w') as f:
+        json.dump(collection, f)
+    with open(environment_path, 'w') as f:
+        json.dump(environment, f)
+    return collection_path, environment_path
+
+
+def request_tasks():
+    # the tasks running a coroutine of the client, e.g. a coalesced call
+    return [task for task in asyncio.all_tasks()
+            if not task.done() and task.get_coro().__qualname__.startswith('HTTPClient.')]
+
+
+async def check(args, output_dir: Path):
+    from aiohttp import web
+
+    from openapi_generator.core.client import HTTPClient
+    from openapi_generator.core.emitter import FORMAT_YAML
+    from openapi_generator.core.pipeline import GenerationPipeline
+
+    # the requests the service is still answering on an open connection, a dropped one does not count even when
+    # its handler is not cancelled
+    handled = {}
+
+    @web.middleware
+    async def track(request, handler):
+        handled[id(request)] = request
+        try:
+            return await handler(request)
+        finally:
+            del handled[id(request)]
+
+    # the slow POST read their body once dropped, which the service would log as an error
+    logging.getLogger('aiohttp.server').setLevel(logging.CRITICAL)
+    app = create_app()
+    app.middlewares.append(track)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    try:
+        collection_path, environment_path = write_collection(output_dir, port, args.endpoints, args.duplicates,
+                                                             args.latency)
+        pipeline = GenerationPipeline(collection_path, environment_path)
+        start = time.perf_counter()
+        client = HTTPClient(deadline=time.monotonic() + args.deadline)
+        try:
+            # the warning of every endpoint missing the deadline is expected
+            with contextlib.redirect_stdout(io.StringIO()):
+                async with client:
+                    await pipeline.generate(output_dir / 'openapi.yaml', FORMAT_YAML, False, False, client)
+                    seconds = time.perf_counter() - start
+                    # a cancelled request takes a few iterations of the loop to close its connection
+                    await asyncio.sleep(args.grace)
+                    left_tasks = request_tasks()
+                    left_requests = [request for request in handled.values()
+                                     if request.transport is not None and not request.transport.is_closing()]
+        finally:
+            pipeline.close()
+        report = pipeline.metrics.report()
+    finally:
+        await runner.cleanup()
+
+    print(f'deadline {args.deadline:.2f} s, run {seconds:.2f} s, {report["endpoints"]} endpoints, '
+          f'{report["fallbacks"]} fallbacks, {report["coalesced"]} coalesced, {report["retries"]} retries')
+    print(f'after the deadline: {len(left_tasks)} request tasks, {len(left_requests)} requests served')
+    errors = []
+    if seconds > args.deadline + args.grace:
+        errors.append(f'the run took {seconds:.2f} s with a deadline of {args.deadline:.2f} s')
+    if not report['fallbacks']:
+        errors.append('no endpoint missed the deadline, the latency is too low to check anything')
+    if left_tasks:
+        errors.append(f'{len(left_tasks)} request tasks still running')
+    if left_requests:
+        errors.append(f'{len(left_requests)} requests still served by the service')
+    if report['retries']:
+        errors.append(f'{report["retries"]} retries after the deadline')
+    if errors:
+        raise SystemExit(f'ERROR: {"; ".join(errors)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Work done after the deadline of a run')
+    parser.add_argument('--deadline', type=float, default=0.5, help='Seconds the run has')
+    parser.add_argument('--latency', type=float, default=5000, help='Milliseconds the slow endpoints answer in')
+    parser.add_argument('--endpoints', type=int, default=20, help='Endpoints of the collection, half of them slow')
+    parser.add_argument('--duplicates', type=int, default=3, help='Copies of every slow GET, coalesced')
+    parser.add_argument('--grace', type=float, default=0.5, help='Seconds allowed to wind down after the deadline')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as output_dir:
+        asyncio.get_event_loop().run_until_complete(check(args, Path(output_dir)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Check that importing the command line tool stays within a time budget and loads none of the heavy dependencies,
+# which are imported only by the runs that use them. Every measure is taken in a fresh interpreter, the best one
+# is compared with the budget, so that the check can run in CI and fail on a regression.
+#
+#   PYTHONPATH=src python benchmarks/check_import_time.py
+#   PYTHONPATH=src python benchmarks/check_import_time.py --budget 120 --runs 10
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PACKAGE = 'openapi_generator'
+DEFAULT_BUDGET_MS = 200
+# loaded only to send requests, to write YAML and by the genson engine
+HEAVY_MODULES = ('aiohttp', 'yaml', 'genson')
+
+_LOADED_AFTER_HELP = f'''
+import contextlib, io, json, sys
+import {PACKAGE}
+sys.argv = ['{PACKAGE}', '--help']
+with contextlib.redirect_stdout(io.StringIO()):
+    try:
+        {PACKAGE}.main()
+    except SystemExit:
+        pass
+print(json.dumps(sorted(name for name in {HEAVY_MODULES!r} if name in sys.modules)))
+'''
+
+
+def import_time_ms() -> float:
+    # cumulative import time of the package as reported by -X importtime
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {PACKAGE}'],
+                            capture_output=True, text=True, env=os.environ, check=True)
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == PACKAGE:
+            return int(fields[1]) / 1000
+    raise RuntimeError(f'no import time reported for {PACKAGE}:\n{result.stderr}')
+
+
+def loaded_heavy_modules():
+    result = subprocess.run([sys.executable, '-c', _LOADED_AFTER_HELP],
+                            capture_output=True, text=True, env=os.environ, check=True)
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f'Import time budget of {PACKAGE}')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_MS, help='Maximum import time in ms')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters measured, the best one is checked')
+    args = parser.parse_args()
+
+    times = [import_time_ms() for _ in range(args.runs)]
+    best = min(times)
+    print(f'import {PACKAGE}: best {best:.1f} ms, worst {max(times):.1f} ms over {args.runs} runs '
+          f'(budget {args.budget:.0f} ms)')
+    heavy = loaded_heavy_modules()
+    print(f'heavy modules loaded by --help: {", ".join(heavy) or "none"}')
+
+    errors = []
+    if best > args.budget:
+        errors.append(f'import time {best:.1f} ms over the budget of {args.budget:.0f} ms')
+    if heavy:
+        errors.append(f'{", ".join(heavy)} imported without being used')
+    if errors:
+        raise SystemExit(f'ERROR: {"; ".join(errors)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# Local stand-in of the API of a synthetic collection: every path returns a JSON payload of the shape and size asked
+# in the query string (shape, items, seed) after a configurable latency, POST bodies are echoed back.
+# With --max-rps the requests above that rate get a 429 with Retry-After, as a throttled shared API.
+#
+#   python benchmarks/standin_server.py --port 8800 --latency 20 --jitter 10 --max-rps 50
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from functools import lru_cache
+
+from aiohttp import web
+
+from bench_inference import make_record
+
+
+def make_flat(rng: random.Random, items: int):
+    return {'data': [{'id': index, 'name': f'name-{rng.random()}', 'price': rng.random() * 100,
+                      'active': rng.random() > 0.5} for index in range(items)]}
+
+
+def make_wide(rng: random.Random, items: int):
+    return {f'field{index}': rng.choice([rng.random(), f'value-{index}', index, True])
+            for index in range(items)}
+
+
+def make_mixed(rng: random.Random, items: int):
+    # the same field holds different types in different records
+    values = [None, 1, 1.5, 'text', {'nested': {'value': 1}}, [1, 2], [{'key': 'a'}]]
+    return {'data': [{'id': index, 'value': rng.choice(values), 'optional': rng.choice(values)}
+                     for index in range(items)]}
+
+
+def make_nested(rng: random.Random, items: int):
+    return {'data': [make_record(rng, 2, 2) for _ in range(items)],
+            'pagination': {'page': 1, 'size': items, 'total': items * 10}}
+
+
+PAYLOADS = {
+    'flat': make_flat,
+    'nested': make_nested,
+    'wide': make_wide,
+    'mixed': make_mixed
+}
+
+
+@lru_cache(maxsize=256)
+def payload_body(shape: str, items: int, seed: int) -> bytes:
+    return json.dumps(PAYLOADS[shape](random.Random(seed), items)).encode()
+
+
+def create_app(latency: float = 0, jitter: float = 0, max_rps: float = 0) -> web.Application:
+    rng = random.Random(0)
+    accepted = deque()
+
+    async def handle(request: web.Request) -> web.Response:
+        if max_rps:
+            now = time.monotonic()
+            while accepted and accepted[0] < now - 1:
+                accepted.popleft()
+            if len(accepted) >= max_rps:
+                return web.json_response({'error': 'too many requests'}, status=429, headers={'Retry-After': '1'})
+            accepted.append(now)
+        delay = float(request.query.get('latency', latency)) + rng.random() * jitter
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if request.method == 'POST':
+            body = await request.read()
+            return web.Response(body=b'{"created":' + (body or b'null') + b',"id":1}', content_type='application/json')
+        shape = request.query.get('shape', 'flat')
+        if shape not in PAYLOADS:
+            return web.json_response({'error': f'unknown shape {shape}'}, status=400)
+        body = payload_body(shape, int(request.query.get('items', 10)), int(request.query.get('seed', 0)))
+        return web.Response(body=body, content_type='application/json')
+
+    app = web.Application()
+    app.add_routes([web.route('*', '/{tail:.*}', handle)])
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in API for the synthetic collections')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--latency', type=float, default=0, help='Milliseconds before every response')
+    parser.add_argument('--jitter', type=float, default=0, help='Random milliseconds added to the latency')
+    parser.add_argument('--max-rps', type=float, default=0, help='Requests per second above which 429 is returned')
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency, args.jitter, args.max_rps), host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
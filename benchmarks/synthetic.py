@@ -0,0 +1,138 @@
+# Generate a synthetic postman collection and environment pointing to the stand-in API of standin_server.py.
+#
+#   python benchmarks/synthetic.py --endpoints 500 --depth 3 --shape nested --items 50 --output-dir /tmp/bench
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+SHAPES = ('flat', 'nested', 'wide', 'mixed')
+METHODS = ('GET', 'GET', 'GET', 'POST')
+
+
+def make_request_body(rng: random.Random) -> Dict[str, Any]:
+    return {
+        'name': f'name-{rng.randint(0, 1000)}',
+        'quantity': rng.randint(1, 10),
+        'options': {'express': rng.random() > 0.5, 'notes': 'none'},
+        'lines': [{'sku': f'sku{i}', 'price': rng.random() * 10} for i in range(3)]
+    }
+
+
+def make_item(index: int,
+              rng: random.Random,
+              shape: str,
+              items: int) -> Dict[str, Any]:
+    method = METHODS[index % len(METHODS)]
+    # POST share the path of the GET before them, to exercise the merge of the methods of the same path
+    resource = f'resource{index - 1 if method == "POST" and index else index}'
+    request = {
+        'method': method,
+        'header': [{'key': 'Accept', 'value': 'application/json'}],
+        'url': {
+            'raw': f'{{{{base}}}}/bench/{resource}',
+            'host': ['{{base}}'],
+            'path': ['bench', resource],
+            'query': [{'key': 'shape', 'value': shape},
+                      {'key': 'items', 'value': str(items)},
+                      {'key': 'seed', 'value': str(index)},
+                      {'key': 'page', 'value': '1'}]
+        }
+    }
+    if method == 'POST':
+        request['body'] = {'mode': 'raw', 'raw': json.dumps(make_request_body(rng))}
+    return {'name': f'{method.lower()}Resource{index}', 'request': request, 'response': []}
+
+
+def make_folders(endpoints: List[Dict[str, Any]],
+                 depth: int,
+                 fanout: int,
+                 prefix: str = 'folder') -> List[Dict[str, Any]]:
+    # endpoints are spread over a tree of folders depth levels deep
+    if depth <= 0 or len(endpoints) <= 1:
+        return endpoints
+    size = max(1, -(-len(endpoints) // fanout))
+    folders = []
+    for number, start in enumerate(range(0, len(endpoints), size)):
+        name = f'{prefix}{number}'
+        folders.append({'name': name, 'item': make_folders(endpoints[start:start + size], depth - 1, fanout, name)})
+    return folders
+
+
+def make_collection(*,
+                    endpoints: int,
+                    depth: int = 2,
+                    fanout: int = 4,
+                    shape: str = 'nested',
+                    items: int = 20,
+                    auth_header: str = 'X-API-Key',
+                    base_url: str = 'http://127.0.0.1:8800',
+                    seed: int = 0) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    if shape not in SHAPES:
+        raise ValueError(f'Unknown payload shape {shape}, choose one of {", ".join(SHAPES)}')
+    rng = random.Random(seed)
+    items_list = [make_item(index, rng, shape, items) for index in range(endpoints)]
+    collection = {
+        'info': {
+            'name': f'Bench {endpoints} endpoints',
+            'schema': 'https://schema.getpostman.com/json/collection/v2.1.0/collection.json'
+        },
+        'item': make_folders(items_list, depth, fanout),
+        'auth': {
+            'type': 'apikey',
+            'apikey': [{'key': 'key', 'value': auth_header},
+                       {'key': 'value', 'value': '{{token}}'}]
+        }
+    }
+    environment = {
+        'name': 'bench',
+        'values': [{'key': 'base', 'value': base_url},
+                   {'key': 'token', 'value': 'bench-token'}]
+    }
+    return collection, environment
+
+
+def write_collection(output_dir: Path, **kwargs) -> Tuple[Path, Path]:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    collection, environment = make_collection(**kwargs)
+    collection_path = output_dir / 'collection.json'
+    environment_path = output_dir / 'environment.json'
+    with open(collection_path, 'w') as f:
+        json.dump(collection, f)
+    with open(environment_path, 'w') as f:
+        json.dump(environment, f)
+    return collection_path, environment_path
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--endpoints', type=int, default=200, help='Endpoints in the collection')
+    parser.add_argument('--depth', type=int, default=2, help='Folder nesting depth')
+    parser.add_argument('--fanout', type=int, default=4, help='Subfolders of every folder')
+    parser.add_argument('--shape', choices=SHAPES, default='nested', help='Shape of the response payloads')
+    parser.add_argument('--items', type=int, default=20, help='Records in every response payload')
+    parser.add_argument('--auth-header', default='X-API-Key', help='Header of the api key auth')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic postman collection and environment')
+    add_arguments(parser)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8800', help='Address of the stand-in API')
+    parser.add_argument('--output-dir', type=Path, required=True)
+    args = parser.parse_args()
+    collection_path, environment_path = write_collection(args.output_dir,
+                                                         endpoints=args.endpoints,
+                                                         depth=args.depth,
+                                                         fanout=args.fanout,
+                                                         shape=args.shape,
+                                                         items=args.items,
+                                                         auth_header=args.auth_header,
+                                                         base_url=args.base_url,
+                                                         seed=args.seed)
+    print(f'collection: {collection_path}')
+    print(f'environment: {environment_path}')
+
+
+if __name__ == '__main__':
+    main()
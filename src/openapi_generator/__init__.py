@@ -1,7 +1,19 @@
 import argparse
+import time
 
-from openapi_generator.core.openapidoc import OpenAPIDoc
-from openapi_generator.core.postmanapidoc import PostmanAPIDoc
+# only what the parser needs is imported with the package, the rest once the arguments are valid
+from openapi_generator.core.cache import ResponseCache
+from openapi_generator.core.client import HTTPClient
+from openapi_generator.core.emitter import FORMATS, FORMAT_YAML
+from openapi_generator.core.inference import ENGINES, ENGINE_NATIVE
+from openapi_generator.core.options import RESPONSE_SOURCES, SOURCE_LIVE, GenerationOptions
+from openapi_generator.core.ratelimit import RateLimiter, RetryPolicy
+from openapi_generator.core.sampling import SamplingPolicy, STRATEGIES, STRATEGY_HEAD
+
+COMMAND_GENERATE = 'generate'
+COMMAND_WATCH = 'watch'
+COMMAND_BATCH = 'batch'
+COMMANDS = (COMMAND_GENERATE, COMMAND_WATCH, COMMAND_BATCH)
 
 
 def main():
@@ -9,11 +21,25 @@ def main():
                                      description='Generate in a simple way your openapi doc',
                                      allow_abbrev=False)
 
+    parser.add_argument('command',
+                        nargs='?',
+                        choices=COMMANDS,
+                        default=COMMAND_GENERATE,
+                        help='generate: generate the openapi doc once (default), '
+                             'watch: keep running and generate it again on every change of the collection or '
+                             'environment, only the changed items are fetched and the doc is rewritten only if '
+                             'its content changes, '
+                             'batch: generate the openapi docs of all the collections of --manifest concurrently')
+
+    parser.add_argument('--debounce',
+                        type=float,
+                        help='Seconds the watched files have to stay unchanged before a new generation '
+                             '(default 0.3)')
+
     parser.add_argument('--postman-collection',
                         '-pc',
                         type=str,
-                        help='Postman collection path',
-                        required=True)
+                        help='Postman collection path')
 
     parser.add_argument('--postman-environment',
                         '-pe',
@@ -23,15 +49,309 @@ def main():
     parser.add_argument('--output',
                         '-o',
                         type=str,
-                        help='Path for generated openapi doc',
-                        required=True)
+                        help='Path for generated openapi doc')
+
+    parser.add_argument('--manifest',
+                        type=str,
+                        help='For batch: JSON list of {"collection", "environment", "output", "format"}, '
+                             'paths relative to the manifest')
+
+    parser.add_argument('--report',
+                        type=str,
+                        help='For batch: path of a JSON report with the status of every collection')
+
+    parser.add_argument('--max-connections',
+                        type=int,
+                        default=HTTPClient.DEFAULT_LIMIT,
+                        help='Maximum number of simultaneous connections (0 means no limit)')
+
+    parser.add_argument('--max-connections-per-host',
+                        type=int,
+                        default=HTTPClient.DEFAULT_LIMIT_PER_HOST,
+                        help='Maximum number of simultaneous connections to the same host (0 means no limit)')
+
+    parser.add_argument('--dns-cache-ttl',
+                        type=int,
+                        default=HTTPClient.DEFAULT_DNS_CACHE_TTL,
+                        help='Seconds a resolved host is cached (0 disables the DNS cache)')
+
+    parser.add_argument('--rate-limit',
+                        type=float,
+                        help='Target requests per second to every host, lowered while the host answers 429 '
+                             '(default no limit until the first 429)')
+
+    parser.add_argument('--retries',
+                        type=int,
+                        default=RetryPolicy.DEFAULT_RETRIES,
+                        help='Retries of a request failed with 429, 5xx or a connection error, '
+                             'with jittered exponential backoff')
+
+    parser.add_argument('--retry-backoff',
+                        type=float,
+                        default=RetryPolicy.DEFAULT_BACKOFF,
+                        help='Seconds of the first backoff, doubled at every retry')
+
+    parser.add_argument('--retry-budget',
+                        type=float,
+                        default=RetryPolicy.DEFAULT_BUDGET,
+                        help='Maximum retries of the whole run as a fraction of the requests')
+
+    parser.add_argument('--connect-timeout',
+                        type=float,
+                        default=HTTPClient.DEFAULT_CONNECT_TIMEOUT,
+                        help='Seconds to connect to a service')
+
+    parser.add_argument('--read-timeout',
+                        type=float,
+                        default=HTTPClient.DEFAULT_READ_TIMEOUT,
+                        help='Seconds to wait for the response of a service between two reads')
+
+    parser.add_argument('--max-response-size',
+                        type=float,
+                        default=HTTPClient.DEFAULT_MAX_BODY_SIZE / (1024 * 1024),
+                        help='Maximum size in MB of a response body: a larger body is read only up to it and its '
+                             'example is taken from its beginning (0 reads every body whole)')
+
+    parser.add_argument('--deadline',
+                        type=float,
+                        help='Seconds the whole run has to fit in: the endpoints still without a response are '
+                             'cancelled and use the cached response, else the example saved in the collection, '
+                             'else only their parameters')
+
+    parser.add_argument('--cache-dir',
+                        type=str,
+                        help='Directory of the response cache, responses are not cached if missing')
+
+    parser.add_argument('--cache-mode',
+                        choices=ResponseCache.MODES,
+                        default=ResponseCache.MODE_RECORD,
+                        help='record: use fresh cached responses and store the new ones, '
+                             'replay: use only cached responses without any network call, '
+                             'refresh: call every endpoint and overwrite the cached responses')
+
+    parser.add_argument('--cache-ttl',
+                        type=float,
+                        help='Seconds a cached response is considered fresh (default no expiry)')
+
+    parser.add_argument('--cache-max-size',
+                        type=float,
+                        help='Maximum size in MB of the response cache, least recently used responses are evicted')
+
+    parser.add_argument('--incremental',
+                        action='store_true',
+                        help='Rebuild only the collection items changed since the previous run, '
+                             'their fingerprints are stored next to the openapi doc')
+
+    parser.add_argument('--stream',
+                        action='store_true',
+                        help='Parse the postman collection incrementally, for very large collections')
+
+    parser.add_argument('--plan-dir',
+                        type=str,
+                        help='Directory of the compiled collections: the parsed items with urls, headers and bodies '
+                             'resolved, reused while collection and environment do not change')
+
+    parser.add_argument('--spill-threshold',
+                        type=float,
+                        help='Size in KB of JSON above which request bodies and response examples are kept '
+                             'compressed until they are needed')
+
+    parser.add_argument('--spill-dir',
+                        type=str,
+                        help='Directory of the temporary file the spilled payloads are written to '
+                             '(default in memory)')
+
+    parser.add_argument('--format',
+                        choices=FORMATS,
+                        default=FORMAT_YAML,
+                        help='Format of the generated openapi doc')
+
+    parser.add_argument('--split',
+                        action='store_true',
+                        help='Write every path and every schema to a file of its own, paths/*.yaml and '
+                             'components/schemas/*.yaml next to the openapi doc, that refers to them with relative '
+                             '$refs. A file is rewritten only when its content changes')
+
+    parser.add_argument('--schema-engine',
+                        choices=ENGINES,
+                        default=ENGINE_NATIVE,
+                        help='native: single pass inference of the split schemas, '
+                             'genson: schemas generated with genson and then split')
+
+    parser.add_argument('--sample-max-items',
+                        type=int,
+                        help='Maximum number of array items used to infer the schemas')
+
+    parser.add_argument('--sample-max-depth',
+                        type=int,
+                        help='Maximum nesting depth of the examples used to infer the schemas')
+
+    parser.add_argument('--sample-strategy',
+                        choices=STRATEGIES,
+                        default=STRATEGY_HEAD,
+                        help='How array items are chosen when they are more than --sample-max-items: '
+                             'head: the first ones, reservoir: at random, stratified: from every item structure')
+
+    parser.add_argument('--example-max-items',
+                        type=int,
+                        help='Maximum number of array items in the examples written in the openapi doc')
+
+    parser.add_argument('--example-max-length',
+                        type=int,
+                        help='Maximum length of the strings in the examples written in the openapi doc')
+
+    parser.add_argument('--samples',
+                        type=int,
+                        default=1,
+                        help='Responses merged in the schema of every endpoint: the live one, the examples saved in '
+                             'the collection and, for paginated GET requests, the following pages')
+
+    parser.add_argument('--response-source',
+                        choices=RESPONSE_SOURCES,
+                        default=SOURCE_LIVE,
+                        help='live: call every endpoint, saved-examples: use only the examples saved in the '
+                             'collection without any network call, saved-then-live: call only the endpoints without '
+                             'a successful saved example. The saved error examples are added to the responses')
+
+    parser.add_argument('--jobs',
+                        '-j',
+                        type=int,
+                        default=1,
+                        help='Processes generating paths and schemas of the endpoints in parallel (0 means one for '
+                             'every core), the openapi doc is the same of a single process run')
+
+    parser.add_argument('--fetch-shards',
+                        type=int,
+                        default=1,
+                        help='Processes fetching the collection, each one a contiguous part of it with its own '
+                             'connections, for very large collections. Connection limits and rate limit are split '
+                             'among them')
+
+    parser.add_argument('--metrics-out',
+                        type=str,
+                        help='Path of a JSON report with the time of every stage, the time, status, bytes received '
+                             'and schema components of every endpoint and the slowest endpoints')
+
+    parser.add_argument('--profile',
+                        type=str,
+                        help='Profile the run with cProfile and save the stats to this path '
+                             '(python -m pstats to read them)')
 
     args = parser.parse_args()
+    if args.command == COMMAND_BATCH and not args.manifest:
+        parser.error('the following arguments are required for batch: --manifest')
+    if args.command != COMMAND_BATCH and (not args.postman_collection or not args.output):
+        parser.error('the following arguments are required: --postman-collection/-pc, --output/-o')
+
+    import cProfile
+
+    from openapi_generator.core.batch import BatchGenerator, read_manifest, save_report
+    from openapi_generator.core.payloads import PayloadStore
+    from openapi_generator.core.pipeline import GenerationPipeline
+    from openapi_generator.core.watch import FileWatcher, watch
+
     postman_collection_path = args.postman_collection
     postman_environment_path = args.postman_environment
     openapi_path = args.output
+    options = GenerationOptions(schema_engine=args.schema_engine,
+                                sampling=SamplingPolicy(max_items=args.sample_max_items,
+                                                        max_depth=args.sample_max_depth,
+                                                        strategy=args.sample_strategy),
+                                example_max_items=args.example_max_items,
+                                example_max_length=args.example_max_length,
+                                samples=args.samples,
+                                response_source=args.response_source)
+    cache = None
+    if args.cache_dir:
+        cache = ResponseCache(args.cache_dir,
+                              mode=args.cache_mode,
+                              ttl=args.cache_ttl,
+                              max_size=None if args.cache_max_size is None else int(args.cache_max_size * 1024 * 1024))
+
+    payload_store = None
+    if args.spill_threshold is not None or args.spill_dir:
+        payload_store = PayloadStore(threshold=PayloadStore.DEFAULT_THRESHOLD if args.spill_threshold is None
+                                     else int(args.spill_threshold * 1024),
+                                     directory=args.spill_dir)
+
+    client_settings = {
+        'limit': args.max_connections,
+        'limit_per_host': args.max_connections_per_host,
+        'dns_cache_ttl': args.dns_cache_ttl,
+        'cache': cache,
+        'rate_limiter': RateLimiter(args.rate_limit),
+        'retry_policy': RetryPolicy(retries=args.retries, backoff=args.retry_backoff, budget=args.retry_budget),
+        'connect_timeout': args.connect_timeout,
+        'read_timeout': args.read_timeout,
+        'max_body_size': int(args.max_response_size * 1024 * 1024)
+    }
+    pipeline = None
+    batch = None
+    if args.command == COMMAND_BATCH:
+        # one client for all the collections, --max-connections is the limit of the whole batch
+        deadline = None if args.deadline is None else time.monotonic() + args.deadline
+        batch = BatchGenerator(read_manifest(args.manifest, args.format),
+                               client=HTTPClient(deadline=deadline, **client_settings),
+                               stream=args.stream,
+                               options=options,
+                               jobs=args.jobs,
+                               payload_store=payload_store,
+                               plan_dir=args.plan_dir,
+                               shards=args.fetch_shards,
+                               split=args.split)
+    else:
+        pipeline = GenerationPipeline(postman_collection_path,
+                                      postman_environment_path,
+                                      deadline=args.deadline,
+                                      stream=args.stream,
+                                      options=options,
+                                      jobs=args.jobs,
+                                      payload_store=payload_store,
+                                      keep_alive=args.command == COMMAND_WATCH,
+                                      plan_dir=args.plan_dir,
+                                      shards=args.fetch_shards,
+                                      split=args.split,
+                                      **client_settings)
 
-    postman_doc = PostmanAPIDoc.factory(postman_collection_path, postman_environment_path)
-    openapi_doc = OpenAPIDoc.create_from_postman_doc(postman_doc)
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    report = None
+    try:
+        if args.command == COMMAND_BATCH:
+            report = batch.run(args.incremental)
+        elif args.command == COMMAND_WATCH:
+            watched_paths = [path for path in (postman_collection_path, postman_environment_path) if path]
+            debounce = FileWatcher.DEFAULT_DEBOUNCE if args.debounce is None else args.debounce
+            try:
+                # the metrics of every run replace the ones of the previous run
+                save_metrics = (lambda run_pipeline: run_pipeline.metrics.save(args.metrics_out)) \
+                    if args.metrics_out else None
+                watch(pipeline, FileWatcher(watched_paths, debounce=debounce), openapi_path, args.format,
+                      args.incremental, after_run=save_metrics)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                pipeline.close()
+        else:
+            pipeline.run(openapi_path, args.format, incremental=args.incremental)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if payload_store is not None:
+            payload_store.close()
 
-    openapi_doc.to_yaml(openapi_path)
\ No newline at end of file
+    if args.command == COMMAND_GENERATE and args.metrics_out:
+        pipeline.metrics.save(args.metrics_out)
+    if report is not None:
+        for result in report['results']:
+            status = result['status'] if result['status'] != 'ok' else 'written' if result['written'] else 'unchanged'
+            print(f'{result["output"]}: {status} in {result["seconds"]:.3f}s, {result["endpoints"]} endpoints, '
+                  f'{result["failed_endpoints"]} failed' + (f' ---> {result["error"]}' if result['error'] else ''))
+        print(f'{report["collections"]} collections, {report["failed_collections"]} failed, '
+              f'in {report["total_seconds"]:.3f}s')
+        if args.report:
+            save_report(report, args.report)
+        if report['failed_collections']:
+            raise SystemExit(1)
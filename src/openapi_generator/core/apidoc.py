@@ -1,7 +1,14 @@
 from typing import Any, Dict, Union, List, Tuple
 
+from .payloads import PayloadStore, inflate
+
 
 class Endpoint:
+    # no instance dict, the subclasses only add behaviour and declare empty slots
+    __slots__ = ('_name', '_path', '_method', '_tags', '_request_query_params', '_request_path_params',
+                 '_request_body', '_response_example', '_fingerprint', '_prebuilt', '_response_builder',
+                 '_response_key', '_other_responses')
+
     def __init__(self,
                  *,
                  name: str,
@@ -11,7 +18,12 @@ class Endpoint:
                  request_query_params: Union[Dict[str, Any], None],
                  request_path_params: Union[Dict[str, Any], None],
                  request_body: Union[Dict[str, Any], None],
-                 response_example: Dict[str, Any]):
+                 response_example: Dict[str, Any],
+                 fingerprint: Union[str, None] = None,
+                 prebuilt: Union[Tuple[Dict[str, Any], Dict[str, Any]], None] = None,
+                 response_builder: Any = None,
+                 response_key: Union[str, None] = None,
+                 other_responses: Union[Dict[str, Any], None] = None):
         self.name = name
         self.path = path
         self.method = method
@@ -20,6 +32,11 @@ class Endpoint:
         self.request_path_params = request_path_params
         self.request_body = request_body
         self.response_example = response_example
+        self.fingerprint = fingerprint
+        self.prebuilt = prebuilt
+        self.response_builder = response_builder
+        self.response_key = response_key
+        self.other_responses = other_responses
 
     @property
     def name(self) -> str:
@@ -71,7 +88,7 @@ class Endpoint:
 
     @property
     def request_body(self) -> Dict[str, Any]:
-        return self._request_body
+        return inflate(self._request_body)
 
     @request_body.setter
     def request_body(self, request_body: Dict[str, Any]):
@@ -79,12 +96,59 @@ class Endpoint:
 
     @property
     def response_example(self) -> Dict[str, Any]:
-        return self._response_example
+        return inflate(self._response_example)
 
     @response_example.setter
     def response_example(self, response_example: Dict[str, Any]):
         self._response_example = response_example
 
+    @property
+    def fingerprint(self) -> str:
+        return self._fingerprint
+
+    @fingerprint.setter
+    def fingerprint(self, fingerprint: str):
+        self._fingerprint = fingerprint
+
+    @property
+    def prebuilt(self) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        return self._prebuilt
+
+    @prebuilt.setter
+    def prebuilt(self, prebuilt: Tuple[Dict[str, Any], Dict[str, Any]]):
+        self._prebuilt = prebuilt
+
+    @property
+    def response_builder(self) -> Any:
+        return self._response_builder
+
+    @response_builder.setter
+    def response_builder(self, response_builder: Any):
+        self._response_builder = response_builder
+
+    @property
+    def response_key(self) -> str:
+        # identifies the request the response example comes from
+        return self._response_key
+
+    @response_key.setter
+    def response_key(self, response_key: str):
+        self._response_key = response_key
+
+    @property
+    def other_responses(self) -> Dict[str, Any]:
+        # examples of the error responses saved in the collection, by status code
+        return self._other_responses
+
+    @other_responses.setter
+    def other_responses(self, other_responses: Dict[str, Any]):
+        self._other_responses = other_responses
+
+    def spill(self, store: PayloadStore):
+        # the large payloads are kept compressed and inflated on every read
+        self._request_body = store.put(self._request_body)
+        self._response_example = store.put(self._response_example)
+
     def __str__(self):
         return f'{self.method.upper()} {self.path}: {self.name}'
 
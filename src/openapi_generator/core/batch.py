@@ -0,0 +1,130 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+from .client import HTTPClient
+from .common import read_json_file
+from .emitter import FORMATS, FORMAT_YAML
+from .openapidoc import OpenAPIDoc
+from .options import GenerationOptions
+from .payloads import PayloadStore
+from .pipeline import GenerationPipeline
+
+
+class BatchEntry:
+    def __init__(self,
+                 collection: Path,
+                 environment: Union[Path, None],
+                 output: Path,
+                 output_format: str = FORMAT_YAML):
+        if output_format not in FORMATS:
+            raise ValueError(f'Unknown format {output_format} for {output}, choose one of {", ".join(FORMATS)}')
+        self.collection = collection
+        self.environment = environment
+        self.output = output
+        self.output_format = output_format
+
+
+def read_manifest(path: Union[str, Path], default_format: str = FORMAT_YAML) -> List[BatchEntry]:
+    # a JSON list of {"collection", "environment", "output", "format"}, relative paths start from the manifest
+    base = Path(path).parent
+    entries = []
+    for item in read_json_file(path):
+        environment = item.get('environment')
+        entries.append(BatchEntry(base / item['collection'],
+                                  None if environment is None else base / environment,
+                                  base / item['output'],
+                                  item.get('format', default_format)))
+    return entries
+
+
+# Generates the openapi docs of many collections concurrently on one event loop. The pipelines share the HTTP
+# client, so a single connection pool whose limits bound the requests of all the collections together, a single
+# rate limiter, retry budget and response cache, and a single executor for the schema inference
+class BatchGenerator:
+    def __init__(self,
+                 entries: List[BatchEntry],
+                 *,
+                 client: HTTPClient,
+                 stream: bool = False,
+                 options: Union[GenerationOptions, None] = None,
+                 jobs: int = 1,
+                 payload_store: Union[PayloadStore, None] = None,
+                 plan_dir: Union[str, Path, None] = None,
+                 shards: int = 1,
+                 split: bool = False):
+        self.entries = entries
+        self._client = client
+        self._stream = stream
+        self._options = GenerationOptions() if options is None else options
+        self._jobs = OpenAPIDoc.resolve_jobs(jobs)
+        self._payload_store = payload_store
+        self._plan_dir = plan_dir
+        # with shards the processes of every collection open their own connections
+        self._shards = shards
+        self._split = split
+
+    async def _generate(self, entry: BatchEntry, executor, incremental: bool) -> Dict[str, Any]:
+        pipeline = GenerationPipeline(entry.collection, entry.environment, stream=self._stream,
+                                      options=self._options, jobs=self._jobs, executor=executor,
+                                      payload_store=self._payload_store, plan_dir=self._plan_dir, shards=self._shards,
+                                      split=self._split)
+        result = {
+            'collection': str(entry.collection),
+            'environment': None if entry.environment is None else str(entry.environment),
+            'output': str(entry.output),
+            'status': 'ok',
+            'error': None,
+            'written': False
+        }
+        start = time.perf_counter()
+        try:
+            # written to a temporary file first, a failed collection leaves its previous output in place
+            result['written'] = await pipeline.generate(entry.output, entry.output_format, incremental, True,
+                                                        self._client)
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = str(e) or type(e).__name__
+        finally:
+            # the client and the executor are shared and stay open, this releases what the pipeline owns
+            pipeline.close()
+        result['seconds'] = time.perf_counter() - start
+        report = pipeline.metrics.report()
+        for name in ('endpoints', 'failed_endpoints', 'requests', 'cache_hits', 'bytes_received', 'retries',
+                     'coalesced', 'fallbacks'):
+            result[name] = report[name]
+        return result
+
+    async def _generate_all(self, executor, incremental: bool) -> List[Dict[str, Any]]:
+        async with self._client:
+            return list(await asyncio.gather(*(self._generate(entry, executor, incremental)
+                                               for entry in self.entries)))
+
+    def run(self, incremental: bool = False) -> Dict[str, Any]:
+        # the combined report of the collections, in the order of the entries
+        start = time.perf_counter()
+        if self._jobs > 1:
+            executor = ProcessPoolExecutor(max_workers=self._jobs)
+        else:
+            executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            results = asyncio.get_event_loop().run_until_complete(self._generate_all(executor, incremental))
+        finally:
+            executor.shutdown()
+        return {
+            'total_seconds': time.perf_counter() - start,
+            'collections': len(results),
+            'failed_collections': sum(result['status'] != 'ok' for result in results),
+            'endpoints': sum(result['endpoints'] for result in results),
+            'failed_endpoints': sum(result['failed_endpoints'] for result in results),
+            'requests': sum(result['requests'] for result in results),
+            'results': results
+        }
+
+
+def save_report(report: Dict[str, Any], path: Union[str, Path]):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Union
+
+
+class CacheMissError(Exception):
+    pass
+
+
+class ResponseCache:
+    MODE_RECORD = 'record'
+    MODE_REPLAY = 'replay'
+    MODE_REFRESH = 'refresh'
+    MODES = (MODE_RECORD, MODE_REPLAY, MODE_REFRESH)
+
+    # headers that change on every call without changing the response
+    _IGNORED_HEADERS = ('postman-token', 'user-agent', 'cache-control', 'connection', 'accept-encoding')
+
+    def __init__(self,
+                 directory: Union[str, Path],
+                 *,
+                 mode: str = MODE_RECORD,
+                 ttl: Union[float, None] = None,
+                 max_size: Union[int, None] = None):
+        if mode not in ResponseCache.MODES:
+            raise ValueError(f'Unknown cache mode {mode}, choose one of {", ".join(ResponseCache.MODES)}')
+        self.directory = Path(directory)
+        self.mode = mode
+        self.ttl = ttl
+        self.max_size = max_size
+        # with max_size, the size of every entry by key from the least to the most recently used, read from the
+        # directory once and then kept up to date by get and put
+        self._index = None
+        self._size = 0
+
+    @staticmethod
+    def key(method: str,
+            url: str,
+            headers: Dict[str, str],
+            body: Any) -> str:
+        relevant_headers = sorted((name.lower(), str(value)) for name, value in headers.items()
+                                  if name.lower() not in ResponseCache._IGNORED_HEADERS)
+        body_hash = hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()
+        key = json.dumps([method.upper(), url, relevant_headers, body_hash])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / f'{key}.json'
+
+    def get(self, key: str, stale: bool = False) -> Any:
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            raise CacheMissError(key)
+        # replay must work offline, so an expired entry is still better than nothing, as for a stale read
+        if not stale and self.mode != ResponseCache.MODE_REPLAY and self.ttl is not None \
+                and time.time() - entry['created'] > self.ttl:
+            raise CacheMissError(key)
+        # the modification time keeps track of the last use for the LRU eviction of the next runs
+        os.utime(path)
+        if self._index is not None and key in self._index:
+            self._index.move_to_end(key)
+        return entry['response']
+
+    def put(self, key: str, response: Any):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._entry_path(key)
+        data = json.dumps({'created': time.time(), 'response': response}).encode()
+        if self.max_size is not None:
+            self._load_index()
+        # a temporary file of its own, many processes can write the same key at the same time
+        descriptor, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if self.max_size is not None:
+            self._size += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            if self._size > self.max_size:
+                self._evict()
+
+    def _load_index(self):
+        if self._index is None:
+            entries = []
+            for entry in self.directory.glob('*.json'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # evicted meanwhile by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.stem))
+            entries.sort(key=lambda e: e[0])
+            self._index = OrderedDict((key, size) for _, size, key in entries)
+            self._size = sum(self._index.values())
+
+    def _evict(self):
+        # the least recently used entries go first; an entry already removed by another process is just forgotten
+        while self._size > self.max_size and self._index:
+            key, size = self._index.popitem(last=False)
+            self._entry_path(key).unlink(missing_ok=True)
+            self._size -= size
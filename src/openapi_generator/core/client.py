@@ -0,0 +1,398 @@
+import asyncio
+import json
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Dict, Tuple, Union
+from urllib.parse import urlsplit
+
+from .cache import ResponseCache, CacheMissError
+from .jsonstream import decode_prefix
+from .metrics import current_endpoint
+from .ratelimit import RateLimiter, RetryPolicy, TokenBucket, parse_retry_after
+
+if TYPE_CHECKING:
+    from aiohttp import ClientResponse
+
+
+class RetryableStatusError(Exception):
+    def __init__(self, status: int, message: str, headers: Any, url: str):
+        super().__init__(status, message)
+        self.status = status
+        self.message = message
+        self.headers = headers
+        self.url = url
+
+    def __str__(self) -> str:
+        return f'{self.status}, message={self.message!r}, url={self.url!r}'
+
+
+class StatusResponseError(Exception):
+    # a response with a status other than 2xx, not retried: its body is not the example of the endpoint but the
+    # one of that status
+    def __init__(self, status: int, body: Any, url: str):
+        super().__init__(status, url)
+        self.status = status
+        self.body = body
+        self.url = url
+
+    def __str__(self) -> str:
+        return f'{self.status}, url={self.url!r}'
+
+
+class DeadlineExceededError(Exception):
+    pass
+
+
+class ClientClosedError(Exception):
+    # a request sent, or retried, after the client has been closed
+    pass
+
+
+class HTTPClient:
+    DEFAULT_LIMIT = 100
+    DEFAULT_LIMIT_PER_HOST = 0
+    DEFAULT_DNS_CACHE_TTL = 10
+    DEFAULT_CONNECT_TIMEOUT = 10
+    DEFAULT_READ_TIMEOUT = 60
+    # the body is only the source of an example: bigger ones add little to the schema and take seconds to decode
+    DEFAULT_MAX_BODY_SIZE = 8 * 1024 * 1024
+    _CHUNK_SIZE = 1 << 16
+    # bodies decoded out of the event loop, which meanwhile keeps sending the requests
+    _EXECUTOR_BODY_SIZE = 1 << 20
+
+    # the server did not process the request, retried whatever the method
+    _THROTTLE_STATUSES = (429, 503)
+    # retried only for the idempotent methods, the request could have been processed
+    _RETRY_STATUSES = (500, 502, 504)
+    _IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+    # identical requests in flight at the same time share one call, only for the methods without side effects
+    _COALESCED_METHODS = ('GET', 'HEAD', 'OPTIONS')
+    # answered without a body
+    _NO_BODY_STATUSES = (204, 205, 304)
+
+    def __init__(self,
+                 *,
+                 limit: int = DEFAULT_LIMIT,
+                 limit_per_host: int = DEFAULT_LIMIT_PER_HOST,
+                 dns_cache_ttl: Union[int, None] = DEFAULT_DNS_CACHE_TTL,
+                 cache: Union[ResponseCache, None] = None,
+                 rate_limiter: Union[RateLimiter, None] = None,
+                 retry_policy: Union[RetryPolicy, None] = None,
+                 connect_timeout: Union[float, None] = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: Union[float, None] = DEFAULT_READ_TIMEOUT,
+                 max_body_size: Union[int, None] = DEFAULT_MAX_BODY_SIZE,
+                 deadline: Union[float, None] = None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.cache = cache
+        self.rate_limiter = RateLimiter() if rate_limiter is None else rate_limiter
+        self.retry_policy = RetryPolicy() if retry_policy is None else retry_policy
+        # seconds to open a connection and between two reads of the response
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # bytes of a response body read at most, the example is then decoded from the beginning of the body.
+        # None or 0 reads the whole body
+        self.max_body_size = max_body_size
+        # time.monotonic() the whole run has to be done by
+        self.deadline = deadline
+        # [task, waiters] of the coalesced calls by request key, the task is cancelled when its last waiter is
+        self._in_flight = {}
+        # the session is created by the first request sent while the client is open, runs answered by the cache
+        # or by the saved examples never create it
+        self._open = False
+        self._session = None
+        # whether every nested context opened the client, only that one closes it
+        self._owners = []
+
+    async def __aenter__(self):
+        # a client opened before, e.g. kept alive between runs, stays open at the end of the context
+        self._owners.append(not self._open)
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._owners.pop():
+            await self.close()
+
+    async def open(self):
+        self._open = True
+
+    def _get_session(self):
+        if not self._open:
+            raise ClientClosedError('the client is closed')
+        if self._session is None:
+            # aiohttp is imported only when the first request is sent, runs answered by the cache or by the saved
+            # examples and the command line help never load it
+            from aiohttp import ClientSession, ClientTimeout, TCPConnector
+            # one connector for the whole run: keep-alive connections are reused across endpoints and
+            # the connector limits bound the number of in-flight requests (total and per host)
+            connector = TCPConnector(limit=self.limit,
+                                     limit_per_host=self.limit_per_host,
+                                     use_dns_cache=self.dns_cache_ttl != 0,
+                                     ttl_dns_cache=self.dns_cache_ttl)
+            timeout = ClientTimeout(total=None, sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+            self._session = ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def close(self):
+        self._open = False
+        # the calls still in flight, e.g. those left by waiters cancelled at the deadline, end with the client
+        tasks = [task for task, _ in self._in_flight.values()]
+        self._in_flight.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def shard_settings(self, shards: int) -> Dict[str, Any]:
+        # the settings of the client of every one of the processes fetching a shard of the collection, they share
+        # the connection limits and the rate
+        rate = self.rate_limiter.rate
+        return {
+            'limit': -(-self.limit // shards) if self.limit else 0,
+            'limit_per_host': -(-self.limit_per_host // shards) if self.limit_per_host else 0,
+            'dns_cache_ttl': self.dns_cache_ttl,
+            'cache': self.cache,
+            'rate_limiter': RateLimiter(None if rate is None else rate / shards, self.rate_limiter.burst),
+            'retry_policy': RetryPolicy(retries=self.retry_policy.retries,
+                                        backoff=self.retry_policy.backoff,
+                                        max_backoff=self.retry_policy.max_backoff,
+                                        budget=self.retry_policy.budget),
+            'connect_timeout': self.connect_timeout,
+            'read_timeout': self.read_timeout,
+            'max_body_size': self.max_body_size
+        }
+
+    def remaining(self) -> Union[float, None]:
+        # seconds left before the deadline, None without a deadline
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    async def until_deadline(self, coroutine: Awaitable[Any]) -> Any:
+        # the coroutine is cancelled when the deadline comes
+        remaining = self.remaining()
+        if remaining is None:
+            return await coroutine
+        if remaining <= 0:
+            coroutine.close()
+            raise DeadlineExceededError()
+        try:
+            return await asyncio.wait_for(coroutine, remaining)
+        except asyncio.TimeoutError:
+            if self.remaining() > 0:
+                raise
+            raise DeadlineExceededError()
+
+    def cached(self,
+               method: str,
+               url: str,
+               headers: Dict[str, str],
+               body: Any) -> Any:
+        # the cached response, even if expired, or None
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.get(ResponseCache.key(method, url, headers, body), stale=True)
+        except CacheMissError:
+            return None
+
+    @staticmethod
+    def request_key(method: str,
+                    url: str,
+                    headers: Dict[str, str],
+                    body: Any) -> str:
+        return ResponseCache.key(method, url, headers, body)
+
+    async def request(self,
+                      method: str,
+                      url: str,
+                      headers: Dict[str, str],
+                      body: Any) -> Any:
+        # the parsed response is the same object for all the coalesced requests and must not be modified
+        if method.upper() not in HTTPClient._COALESCED_METHODS:
+            return await self._request(method, url, headers, body)
+        key = HTTPClient.request_key(method, url, headers, body)
+        entry = self._in_flight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(self._request(method, url, headers, body, key))
+            entry = self._in_flight[key] = [task, 0]
+            task.add_done_callback(lambda done: self._request_done(key, done))
+        else:
+            endpoint_metrics = current_endpoint()
+            if endpoint_metrics is not None:
+                endpoint_metrics.coalesced += 1
+        task = entry[0]
+        entry[1] += 1
+        try:
+            # a waiter cancelled, e.g. by the deadline, does not cancel the call the others are waiting for
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not task.done():
+                # the last waiter has been cancelled, nobody needs the call any more: it is cancelled too, and
+                # forgotten at once so that a new request does not wait for a call being cancelled
+                if self._in_flight.get(key) is entry:
+                    del self._in_flight[key]
+                task.cancel()
+
+    def _request_done(self, key: str, task: asyncio.Future):
+        entry = self._in_flight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # retrieved here too, all its waiters could have been cancelled
+            task.exception()
+
+    async def _request(self,
+                       method: str,
+                       url: str,
+                       headers: Dict[str, str],
+                       body: Any,
+                       key: Union[str, None] = None) -> Any:
+        if self.cache is None:
+            return await self._fetch(method, url, headers, body)
+
+        key = HTTPClient.request_key(method, url, headers, body) if key is None else key
+        if self.cache.mode != ResponseCache.MODE_REFRESH:
+            try:
+                response = self.cache.get(key)
+                endpoint_metrics = current_endpoint()
+                if endpoint_metrics is not None:
+                    endpoint_metrics.record_response(None, 0, cached=True)
+                return response
+            except CacheMissError:
+                if self.cache.mode == ResponseCache.MODE_REPLAY:
+                    raise CacheMissError(f'no cached response for {method.upper()} {url}')
+        response = await self._fetch(method, url, headers, body)
+        self.cache.put(key, response)
+        return response
+
+    def _is_retryable(self, method: str, error: Exception) -> bool:
+        from aiohttp import ClientConnectionError, ClientConnectorError, ClientPayloadError
+        idempotent = method.upper() in HTTPClient._IDEMPOTENT_METHODS
+        if isinstance(error, RetryableStatusError):
+            return error.status in HTTPClient._THROTTLE_STATUSES or idempotent
+        # a connection never established is safe to retry, a dropped one only for idempotent requests
+        if isinstance(error, ClientConnectorError):
+            return True
+        return idempotent and isinstance(error, (ClientConnectionError, ClientPayloadError, asyncio.TimeoutError))
+
+    async def _fetch(self,
+                     method: str,
+                     url: str,
+                     headers: Dict[str, str],
+                     body: Any) -> Any:
+        bucket = self.rate_limiter.bucket(urlsplit(url).netloc)
+        self.retry_policy.record_request()
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            retry_after = None
+            try:
+                return await self._fetch_once(method, url, headers, body, bucket)
+            except Exception as e:
+                throttled = isinstance(e, RetryableStatusError) and e.status in HTTPClient._THROTTLE_STATUSES
+                # a closed client does not retry, nor charge the retry budget
+                if not self._open or not self._is_retryable(method, e) or \
+                        not self.retry_policy.allow_retry(attempt, throttled):
+                    raise
+                if isinstance(e, RetryableStatusError):
+                    retry_after = parse_retry_after(e.headers.get('Retry-After') if e.headers else None)
+            endpoint_metrics = current_endpoint()
+            if endpoint_metrics is not None:
+                endpoint_metrics.retries += 1
+            await asyncio.sleep(self.retry_policy.delay(attempt, retry_after))
+            attempt += 1
+
+    async def _fetch_once(self,
+                          method: str,
+                          url: str,
+                          headers: Dict[str, str],
+                          body: Any,
+                          bucket: TokenBucket) -> Any:
+        async with self._get_session().request(method,
+                                               url=url,
+                                               json=body,
+                                               headers=headers) as response:
+            if response.status in HTTPClient._THROTTLE_STATUSES:
+                bucket.throttled(parse_retry_after(response.headers.get('Retry-After')))
+            if response.status in HTTPClient._THROTTLE_STATUSES or response.status in HTTPClient._RETRY_STATUSES:
+                raise RetryableStatusError(response.status, response.reason or '', response.headers, str(response.url))
+            bucket.succeeded()
+            if method.upper() == 'HEAD' or response.status in HTTPClient._NO_BODY_STATUSES:
+                body, truncated = b'', False
+            else:
+                body, truncated = await self._read_body(response)
+            content_type = response.headers.get('Content-Type')
+            endpoint_metrics = current_endpoint()
+            if endpoint_metrics is not None:
+                endpoint_metrics.record_response(response.status, len(body), content_type=content_type)
+            try:
+                if len(body) > HTTPClient._EXECUTOR_BODY_SIZE:
+                    value = await asyncio.get_event_loop().run_in_executor(None, HTTPClient._decode_body, body,
+                                                                           truncated, response.charset, content_type)
+                else:
+                    value = HTTPClient._decode_body(body, truncated, response.charset, content_type)
+            except ValueError:
+                # e.g. an HTML page, the endpoint is left without example instead of failing
+                print(f'WARNING: {method.upper()} {url} answered {response.status} with '
+                      f'{content_type or "a body"} that is not JSON, no example taken')
+                if endpoint_metrics is not None:
+                    endpoint_metrics.non_json += 1
+                value = None
+                truncated = False
+            if truncated:
+                print(f'WARNING: {method.upper()} {url} answered more than {self.max_body_size} bytes, example '
+                      f'taken from the beginning of the body')
+                if endpoint_metrics is not None:
+                    endpoint_metrics.truncated += 1
+            if not 200 <= response.status < 300 and response.status not in HTTPClient._NO_BODY_STATUSES:
+                if endpoint_metrics is not None:
+                    endpoint_metrics.error_responses += 1
+                raise StatusResponseError(response.status, value, str(response.url))
+            return value
+
+    async def _read_body(self, response: 'ClientResponse') -> Tuple[bytes, bool]:
+        # the body up to max_body_size bytes and whether it has been cut there, the rest is not read and the
+        # connection is closed instead of going back to the pool
+        if not self.max_body_size:
+            return await response.read(), False
+        if (response.content_length or 0) > self.max_body_size and \
+                not HTTPClient._is_json_content_type(response.headers.get('Content-Type')):
+            # nothing to take from the beginning of a body that is not JSON
+            return b'', True
+        body = bytearray()
+        async for chunk in response.content.iter_chunked(HTTPClient._CHUNK_SIZE):
+            body += chunk
+            if len(body) > self.max_body_size:
+                del body[self.max_body_size:]
+                return bytes(body), True
+        return bytes(body), False
+
+    @staticmethod
+    def _is_json_content_type(content_type: Union[str, None]) -> bool:
+        # application/json and the structured syntax suffix, e.g. application/problem+json, a missing content type
+        # is given the benefit of the doubt
+        if not content_type:
+            return True
+        mime_type = content_type.split(';', 1)[0].strip().lower()
+        return mime_type.endswith('/json') or mime_type.endswith('+json')
+
+    @staticmethod
+    def _decode_body(body: bytes,
+                     truncated: bool,
+                     charset: Union[str, None],
+                     content_type: Union[str, None]) -> Any:
+        # the JSON value of the body, None for an empty body, ValueError for a body that is not JSON
+        if not truncated and not body.strip():
+            return None
+        if not HTTPClient._is_json_content_type(content_type):
+            raise ValueError(f'content type {content_type}')
+        try:
+            # a multi-byte character can be cut at the end of a truncated body
+            text = body.decode(charset or 'utf-8', errors='ignore' if truncated else 'strict')
+        except LookupError:
+            raise ValueError(f'unknown charset {charset}')
+        return decode_prefix(text) if truncated else json.loads(text)
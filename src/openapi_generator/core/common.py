@@ -1,7 +1,7 @@
 import json
 import pprint
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Union
 
 
 def read_json_file(path: Path) -> Dict[str, Any]:
@@ -10,18 +10,19 @@ def read_json_file(path: Path) -> Dict[str, Any]:
     return data
 
 
-def truncate_string(item):
+def truncate_string(item, max_length: Union[int, None] = 40, max_items: Union[int, None] = None):
     if isinstance(item, list):
         new_item = list()
-        for i in range(0, len(item)):
-            new_item.append(truncate_string(item[i]))
+        length = len(item) if max_items is None else min(len(item), max_items)
+        for i in range(0, length):
+            new_item.append(truncate_string(item[i], max_length, max_items))
     elif isinstance(item, dict):
         new_item = dict()
         for key, value in item.items():
-            new_item[key] = truncate_string(value)
+            new_item[key] = truncate_string(value, max_length, max_items)
     elif isinstance(item, str):
-        if len(item) > 40:
-            new_item = f'{item[:40]}...'
+        if max_length is not None and len(item) > max_length:
+            new_item = f'{item[:max_length]}...'
         else:
             new_item = item
     else:
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, TextIO, Union
+
+from .schemas import REF_PREFIX
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# The document is written while it is produced: start writes the header fields, write_path is called once
+# for every path with all its operations and end writes the components
+class DocumentEmitter:
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+
+    def start(self, header: Dict[str, Any]):
+        raise NotImplementedError
+
+    def write_path(self, path: str, path_item: Dict[str, Any]):
+        raise NotImplementedError
+
+    def end(self, components: Dict[str, Any]):
+        raise NotImplementedError
+
+
+def _json_dumps(data: Any) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(data).decode()
+        except TypeError:
+            # e.g. integers bigger than 64 bits
+            pass
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class JSONEmitter(DocumentEmitter):
+    def __init__(self, stream: TextIO):
+        super().__init__(stream)
+        self._first_path = True
+
+    def start(self, header: Dict[str, Any]):
+        self._stream.write(_json_dumps(header)[:-1])
+        self._stream.write(',"paths":{' if header else '"paths":{')
+
+    def write_path(self, path: str, path_item: Dict[str, Any]):
+        if not self._first_path:
+            self._stream.write(',')
+        self._first_path = False
+        self._stream.write(f'{_json_dumps(path)}:{_json_dumps(path_item)}')
+
+    def end(self, components: Dict[str, Any]):
+        self._stream.write(f'}},"components":{_json_dumps(components)}}}\n')
+
+
+FORMAT_YAML = 'yaml'
+FORMAT_JSON = 'json'
+FORMATS = (FORMAT_YAML, FORMAT_JSON)
+
+
+# Writes every path and every schema to a file of its own next to the root document, paths/<path>.yaml and
+# components/schemas/<name>.yaml, that the root document and the other files refer to with relative $refs.
+# The files are serialized and written by a thread pool while the document is produced, and a file is rewritten
+# only when the hash of its content differs from the one of the previous run, kept in <root document>.files.json
+class SplitEmitter(DocumentEmitter):
+    PATHS_DIR = 'paths'
+    SCHEMAS_DIR = 'components/schemas'
+    _UNSAFE_CHARS = re.compile(r'[^A-Za-z0-9_.{}-]')
+
+    def __init__(self,
+                 stream: TextIO,
+                 output_path: Union[str, Path],
+                 output_format: str = FORMAT_YAML,
+                 workers: Union[int, None] = None):
+        super().__init__(stream)
+        self._root = create_emitter(output_format, stream)
+        self._format = output_format
+        self._directory = Path(output_path).parent
+        self._manifest_path = Path(f'{output_path}.files.json')
+        self._previous_hashes = self._load_manifest()
+        # relative path of the file of every path and schema, the names taken ignoring the case in every directory
+        self._files = {}
+        self._taken = {SplitEmitter.PATHS_DIR: set(), SplitEmitter.SCHEMAS_DIR: set()}
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._futures = []
+
+    def _load_manifest(self) -> Dict[str, str]:
+        try:
+            with open(self._manifest_path) as f:
+                return json.load(f)['files']
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def _file(self, directory: str, name: str) -> str:
+        key = (directory, name)
+        if key not in self._files:
+            stem = SplitEmitter._UNSAFE_CHARS.sub('_', name.strip('/').replace('/', '_')) or 'root'
+            unique = stem
+            counter = 2
+            while unique.lower() in self._taken[directory]:
+                unique = f'{stem}{counter}'
+                counter += 1
+            self._taken[directory].add(unique.lower())
+            self._files[key] = f'{directory}/{unique}.{self._format}'
+        return self._files[key]
+
+    def _external_refs(self, item: Any, directory: str) -> Any:
+        # the refs to the schemas of the document become refs to their files, relative to the directory of the
+        # file the item is written to
+        if isinstance(item, dict):
+            new_item = {}
+            for key, value in item.items():
+                if key == '$ref' and isinstance(value, str) and value.startswith(REF_PREFIX):
+                    schema_file = self._file(SplitEmitter.SCHEMAS_DIR, value[len(REF_PREFIX):])
+                    new_item[key] = posixpath.relpath(schema_file, directory)
+                else:
+                    new_item[key] = self._external_refs(value, directory)
+            return new_item
+        if isinstance(item, list):
+            return [self._external_refs(value, directory) for value in item]
+        return item
+
+    def _dumps(self, data: Any) -> bytes:
+        if self._format == FORMAT_YAML:
+            from .yamlemitter import dump_yaml
+            return dump_yaml(data).encode('utf-8')
+        return f'{_json_dumps(data)}\n'.encode('utf-8')
+
+    def _write_file(self, relative_path: str, data: Any) -> str:
+        # runs in the pool, returns the hash of the content
+        content = self._dumps(data)
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._directory / relative_path
+        if self._previous_hashes.get(relative_path) == digest and path.exists():
+            return digest
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f'{path.name}.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+        return digest
+
+    def _submit(self, relative_path: str, data: Any):
+        self._futures.append((relative_path, self._pool.submit(self._write_file, relative_path, data)))
+
+    def start(self, header: Dict[str, Any]):
+        self._root.start(header)
+
+    def write_path(self, path: str, path_item: Dict[str, Any]):
+        relative_path = self._file(SplitEmitter.PATHS_DIR, path)
+        self._submit(relative_path, self._external_refs(path_item, SplitEmitter.PATHS_DIR))
+        self._root.write_path(path, {'$ref': relative_path})
+
+    def end(self, components: Dict[str, Any]):
+        schemas = {}
+        for name, schema in components['schemas'].items():
+            relative_path = self._file(SplitEmitter.SCHEMAS_DIR, name)
+            self._submit(relative_path, self._external_refs(schema, SplitEmitter.SCHEMAS_DIR))
+            schemas[name] = {'$ref': relative_path}
+        try:
+            hashes = {relative_path: future.result() for relative_path, future in self._futures}
+        finally:
+            self._pool.shutdown()
+        # the files of the paths and schemas no longer in the document
+        for relative_path in self._previous_hashes.keys() - hashes.keys():
+            try:
+                os.remove(self._directory / relative_path)
+            except OSError:
+                pass
+        with open(self._manifest_path, 'w') as f:
+            json.dump({'files': hashes}, f, indent=2)
+        self._root.end(dict(components, schemas=schemas))
+
+
+def create_emitter(output_format: str,
+                   stream: TextIO,
+                   split_path: Union[str, Path, None] = None) -> DocumentEmitter:
+    # with split_path, the path of the root document, paths and schemas are written to files of their own
+    if split_path is not None:
+        return SplitEmitter(stream, split_path, output_format)
+    if output_format == FORMAT_YAML:
+        # yaml is imported only when a YAML document is written
+        from .yamlemitter import YAMLEmitter
+        return YAMLEmitter(stream)
+    if output_format == FORMAT_JSON:
+        return JSONEmitter(stream)
+    raise ValueError(f'Unknown output format {output_format}, choose one of {", ".join(FORMATS)}')
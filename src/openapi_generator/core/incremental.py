@@ -0,0 +1,72 @@
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Tuple, Union
+
+
+class IncrementalState:
+    _VERSION = 1
+    _VARIABLE_PATTERN = re.compile(r'{{([^{}]+)}}')
+
+    def __init__(self,
+                 entries: Dict[str, Dict[str, Any]] = None,
+                 settings: Union[str, None] = None):
+        self.entries = {} if entries is None else entries
+        # the generation options the fragments have been built with
+        self.settings = settings
+
+    @staticmethod
+    def state_path(output_path: Union[str, Path]) -> Path:
+        return Path(f'{output_path}.fingerprints.json')
+
+    @classmethod
+    def load(cls, output_path: Union[str, Path], settings: Union[str, None] = None):
+        state_path = IncrementalState.state_path(output_path)
+        # without the previous document the stored fragments can not be trusted
+        if not Path(output_path).exists() or not state_path.exists():
+            return cls(settings=settings)
+        try:
+            with open(state_path) as f:
+                data = json.load(f)
+        except ValueError:
+            return cls(settings=settings)
+        if data.get('version') != IncrementalState._VERSION or data.get('settings') != settings:
+            return cls(settings=settings)
+        return cls(data['entries'], settings)
+
+    def save(self, output_path: Union[str, Path]):
+        with open(IncrementalState.state_path(output_path), 'w') as f:
+            json.dump({'version': IncrementalState._VERSION, 'settings': self.settings, 'entries': self.entries}, f)
+
+    @staticmethod
+    def fingerprint(tags: Tuple,
+                    item: Dict[str, Any],
+                    variables: Dict[str, str],
+                    path_params: Union[Dict[str, str], None],
+                    auth: Dict[str, Any],
+                    saved_responses: bool = False) -> str:
+        request = json.dumps(item['request'], sort_keys=True)
+        referenced_variables = {name: variables.get(name) for name in
+                                sorted(set(IncrementalState._VARIABLE_PATTERN.findall(request)))}
+        parts = [list(tags), item['name'], request, referenced_variables, path_params, auth]
+        if saved_responses:
+            # the fragment is built from the examples saved in the item, they are part of it
+            parts.append(item.get('response', []))
+        fingerprint = json.dumps(parts, sort_keys=True)
+        return hashlib.sha256(fingerprint.encode()).hexdigest()
+
+    def lookup(self, fingerprint: str) -> Union[Tuple[Dict[str, Any], Dict[str, Any]], None]:
+        entry = self.entries.get(fingerprint)
+        if entry is None:
+            return None
+        return entry['operation'], entry['schemas']
+
+    def record(self,
+               fingerprint: str,
+               operation: Dict[str, Any],
+               schemas: Dict[str, Any]):
+        self.entries[fingerprint] = {
+            'operation': operation,
+            'schemas': schemas
+        }
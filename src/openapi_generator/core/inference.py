@@ -0,0 +1,277 @@
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Union
+
+if TYPE_CHECKING:
+    from genson import SchemaBuilder
+
+from .sampling import Truncated
+from .schemas import REF_PREFIX, unique_name
+
+ENGINE_NATIVE = 'native'
+ENGINE_GENSON = 'genson'
+ENGINES = (ENGINE_NATIVE, ENGINE_GENSON)
+
+# bool before int, as bool is a subclass of int
+_SCALAR_TYPES = {
+    bool: 'boolean',
+    int: 'integer',
+    float: 'number',
+    str: 'string',
+    type(None): 'null'
+}
+
+
+def scalar_schemas(types: Iterable[str]) -> List[Dict[str, Any]]:
+    # OpenAPI 3.0 has neither a null type nor lists of types: null makes the other types nullable, a value seen
+    # only as null is an object that can be null, and every other type is an alternative of an anyOf
+    types = set(types)
+    if 'integer' in types and 'number' in types:
+        types.discard('integer')
+    nullable = 'null' in types
+    types.discard('null')
+    if not types:
+        return [{'type': 'object', 'nullable': True}]
+    if nullable:
+        return [{'type': scalar_type, 'nullable': True} for scalar_type in sorted(types)]
+    return [{'type': scalar_type} for scalar_type in sorted(types)]
+
+
+def scalar_schema(types: Iterable[str]) -> Dict[str, Any]:
+    schemas = scalar_schemas(types)
+    return schemas[0] if len(schemas) == 1 else {'anyOf': schemas}
+
+
+class _Shape:
+    # merged structure of all the values seen in the same position of the examples
+    __slots__ = ('types', 'properties', 'items', 'is_array', 'open_object', 'open_array')
+
+    def __init__(self):
+        self.types = set()
+        self.properties = None
+        self.items = None
+        self.is_array = False
+        # set when a container cut by the sampling has been seen, its content can be anything
+        self.open_object = False
+        self.open_array = False
+
+    def add(self, value: Any):
+        value_type = type(value)
+        if value_type is dict:
+            if self.properties is None:
+                self.properties = {}
+            properties = self.properties
+            for key, sub_value in value.items():
+                shape = properties.get(key)
+                if shape is None:
+                    shape = properties[key] = _Shape()
+                shape.add(sub_value)
+        elif value_type is list:
+            self.is_array = True
+            if value:
+                items = self.items
+                if items is None:
+                    items = self.items = _Shape()
+                for item in value:
+                    items.add(item)
+        elif value_type in _SCALAR_TYPES:
+            self.types.add(_SCALAR_TYPES[value_type])
+        elif value_type is Truncated:
+            if value.kind == 'object':
+                if self.properties is None:
+                    self.properties = {}
+                self.open_object = True
+            else:
+                self.is_array = True
+                self.open_array = True
+        elif isinstance(value, dict):
+            self.add(dict(value))
+        elif isinstance(value, (list, tuple)):
+            self.add(list(value))
+        else:
+            for scalar_type, name in _SCALAR_TYPES.items():
+                if isinstance(value, scalar_type):
+                    self.types.add(name)
+                    break
+
+    def is_object(self) -> bool:
+        # a field that is sometimes null is described by its non null shape
+        return self.properties is not None and not self.is_array and self.types <= {'null'}
+
+    def is_only_array(self) -> bool:
+        return self.is_array and self.properties is None and self.types <= {'null'}
+
+
+# Schema builder with the same interface of genson SchemaBuilder: examples are merged in a light structure
+# with add_object, to_components walks that structure once and emits the components already split
+# and linked through $ref, as OpenAPIEndpoint._split_schema_in_subschemas does with genson schemas
+class SchemaInferrer:
+    def __init__(self):
+        self._root = None
+
+    def add_object(self, obj: Any):
+        if self._root is None:
+            self._root = _Shape()
+        self._root.add(obj)
+
+    def to_components(self, prefix: str) -> Dict[str, Any]:
+        components = {}
+        if self._root is not None:
+            SchemaInferrer._emit_component(self._root, prefix, prefix, components)
+        return components
+
+    @staticmethod
+    def _ref(name: str) -> Dict[str, str]:
+        return {'$ref': f'{REF_PREFIX}{name}'}
+
+    @staticmethod
+    def _emit_component(shape: _Shape, prefix: str, name: str, components: Dict[str, Any]) -> str:
+        if shape.is_object():
+            properties = {}
+            for prop_name, prop_shape in shape.properties.items():
+                properties[prop_name] = SchemaInferrer._property_schema(prop_shape, prop_name, prefix, components)
+            schema = {'type': 'object'}
+            if properties or not shape.open_object:
+                schema['properties'] = properties
+            if not shape.open_object:
+                schema['additionalProperties'] = False
+        elif shape.is_only_array():
+            schema = SchemaInferrer._array_schema(shape, prefix, prefix, f'{prefix}Item', components)
+        else:
+            schema = SchemaInferrer._mixed_schema(shape, prefix, prefix, name, components)
+        name = unique_name(name, components)
+        components[name] = schema
+        return name
+
+    @staticmethod
+    def _array_schema(shape: _Shape,
+                      prop_name: str,
+                      prefix: str,
+                      items_name: str,
+                      components: Dict[str, Any]) -> Dict[str, Any]:
+        items = shape.items
+        if items is None and shape.open_array:
+            return {'type': 'array'}
+        if items is None:
+            print(f'WARNING: Can not determine items type of {prop_name} in {prefix} default choose string type')
+            items_schema = {'type': 'string'}
+        elif items.is_object() or items.is_only_array():
+            items_schema = SchemaInferrer._ref(SchemaInferrer._emit_component(items, prefix, items_name, components))
+        else:
+            items_schema = SchemaInferrer._mixed_schema(items, prop_name, prefix, items_name, components)
+        return {
+            'type': 'array',
+            'items': items_schema
+        }
+
+    @staticmethod
+    def _property_schema(shape: _Shape,
+                         prop_name: str,
+                         prefix: str,
+                         components: Dict[str, Any]) -> Dict[str, Any]:
+        sub_component_name = f'{prefix}{prop_name[:1].capitalize() + prop_name[1:]}'
+        if shape.is_object() and shape.open_object and not shape.properties:
+            return {'type': 'object'}
+        if shape.is_object():
+            return SchemaInferrer._ref(SchemaInferrer._emit_component(shape, prefix, sub_component_name, components))
+        if shape.is_only_array():
+            return SchemaInferrer._array_schema(shape, prop_name, prefix, sub_component_name, components)
+        if shape.types == {'null'} and shape.properties is None and not shape.is_array:
+            return {'type': 'object'}
+        return SchemaInferrer._mixed_schema(shape, prop_name, prefix, sub_component_name, components)
+
+    @staticmethod
+    def _mixed_schema(shape: _Shape,
+                      prop_name: str,
+                      prefix: str,
+                      name: str,
+                      components: Dict[str, Any]) -> Dict[str, Any]:
+        schemas = []
+        types = shape.types
+        if types == {'null'} and (shape.properties is not None or shape.is_array):
+            # as for objects and arrays alone, a value sometimes null is described by its non null shapes
+            types = set()
+        if types:
+            schemas.extend(scalar_schemas(types))
+        if shape.properties is not None:
+            object_shape = _Shape()
+            object_shape.properties = shape.properties
+            object_shape.open_object = shape.open_object
+            schemas.append(SchemaInferrer._ref(SchemaInferrer._emit_component(object_shape, prefix, name,
+                                                                              components)))
+        if shape.is_array:
+            array_shape = _Shape()
+            array_shape.is_array = True
+            array_shape.items = shape.items
+            array_shape.open_array = shape.open_array
+            schemas.append(SchemaInferrer._array_schema(array_shape, prop_name, prefix, f'{name}Item',
+                                                        components))
+        if len(schemas) == 1:
+            return schemas[0]
+        return {'anyOf': schemas}
+
+
+def infer_components(prefix: str, example: Any) -> Dict[str, Any]:
+    inferrer = SchemaInferrer()
+    inferrer.add_object(example)
+    return inferrer.to_components(prefix)
+
+
+def _genson_builder_class():
+    # genson is imported only by the runs that use it; its object and list strategies are extended to take the
+    # Truncated markers, that give {type: object, additionalProperties: true} and {type: array, items: {}}
+    from genson import SchemaBuilder
+    from genson.schema.strategies import List, Object
+
+    class OpenObject(Object):
+        @staticmethod
+        def match_object(obj):
+            return isinstance(obj, dict) or isinstance(obj, Truncated) and obj.kind == 'object'
+
+        def __init__(self, node_class):
+            super().__init__(node_class)
+            self._open = False
+
+        def add_object(self, obj):
+            if isinstance(obj, Truncated):
+                self._open = True
+            else:
+                super().add_object(obj)
+
+        def to_schema(self):
+            schema = super().to_schema()
+            if self._open:
+                schema['additionalProperties'] = True
+            return schema
+
+    class OpenList(List):
+        @staticmethod
+        def match_object(obj):
+            return isinstance(obj, list) or isinstance(obj, Truncated) and obj.kind == 'array'
+
+        def __init__(self, node_class):
+            super().__init__(node_class)
+            self._open = False
+
+        def add_object(self, obj):
+            if isinstance(obj, Truncated):
+                self._open = True
+            else:
+                super().add_object(obj)
+
+        def to_schema(self):
+            schema = super().to_schema()
+            if self._open and 'items' not in schema:
+                schema['items'] = {}
+            return schema
+
+    class OpenSchemaBuilder(SchemaBuilder):
+        EXTRA_STRATEGIES = (OpenObject, OpenList)
+
+    return OpenSchemaBuilder
+
+
+def create_schema_builder(engine: str) -> Union[SchemaInferrer, 'SchemaBuilder']:
+    if engine == ENGINE_NATIVE:
+        return SchemaInferrer()
+    if engine == ENGINE_GENSON:
+        return _genson_builder_class()()
+    raise ValueError(f'Unknown schema engine {engine}, choose one of {", ".join(ENGINES)}')
@@ -0,0 +1,238 @@
+import json
+import re
+from typing import Any, Iterator, TextIO, Iterable
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_SCALAR = re.compile(r'[^ \t\n\r,:\]}]+')
+# a whole string once its escapes are dropped, the quote of a string cut before its end is left alone
+_STRING = re.compile(rb'"[^"]*"')
+# the bytes that are neither a quote nor a structural character
+_NOT_STRUCTURE = bytes(code for code in range(256) if code not in b'"[]{}')
+_CLOSE = {'[': ']', '{': '}'}
+_DECODER = json.JSONDecoder()
+
+
+class JSONStreamError(ValueError):
+    pass
+
+
+# Event based reader of a JSON document: objects and arrays are walked one member at a time with iter_object and
+# iter_array, every member has to be consumed with read_value, skip_value or a nested iteration before moving to the
+# next one. Only the current chunk of the file and the values explicitly read are kept in memory.
+class JSONStreamReader:
+
+    DEFAULT_CHUNK_SIZE = 1 << 16
+
+    def __init__(self, file: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._capture = None
+        self._eof = False
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        # drop what has already been consumed unless a value is being captured
+        start = self._pos if self._capture is None else self._capture
+        if start:
+            self._buffer = self._buffer[start:]
+            self._pos -= start
+            if self._capture is not None:
+                self._capture = 0
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise JSONStreamError('unexpected end of JSON document')
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise JSONStreamError(f'expected {char!r} at offset {self._pos} of the current chunk, '
+                                  f'found {self._buffer[self._pos]!r}')
+        self._pos += 1
+
+    def _skip_string_body(self):
+        # the opening quote has already been consumed
+        while True:
+            match = _STRING_SPECIAL.search(self._buffer, self._pos)
+            if match is None:
+                self._pos = len(self._buffer)
+                if not self._fill():
+                    raise JSONStreamError('unterminated string')
+                continue
+            if match.group() == '"':
+                self._pos = match.end()
+                return
+            # an escape sequence, make sure the escaped character is in the buffer
+            self._pos = match.end()
+            while self._pos >= len(self._buffer):
+                if not self._fill():
+                    raise JSONStreamError('unterminated string')
+            self._pos += 1
+
+    def _skip_scalar(self):
+        while True:
+            match = _SCALAR.match(self._buffer, self._pos)
+            end = match.end() if match else self._pos
+            if end < len(self._buffer) or not self._fill():
+                self._pos = end
+                return
+
+    def skip_value(self):
+        char = self._peek()
+        if char == '"':
+            self._pos += 1
+            self._skip_string_body()
+        elif char in '[{':
+            self._pos += 1
+            depth = 1
+            while depth:
+                match = _STRUCTURE.search(self._buffer, self._pos)
+                if match is None:
+                    self._pos = len(self._buffer)
+                    if not self._fill():
+                        raise JSONStreamError('unterminated container')
+                    continue
+                self._pos = match.end()
+                token = match.group()
+                if token == '"':
+                    self._skip_string_body()
+                elif token in '[{':
+                    depth += 1
+                else:
+                    depth -= 1
+        else:
+            self._skip_scalar()
+
+    def read_value(self) -> Any:
+        self._peek()
+        self._capture = self._pos
+        try:
+            self.skip_value()
+            text = self._buffer[self._capture:self._pos]
+        finally:
+            self._capture = None
+        return json.loads(text)
+
+    def read_filtered_value(self, skip_keys: Iterable[str]) -> Any:
+        # members named in skip_keys are left out at any depth
+        skip_keys = frozenset(skip_keys)
+        char = self._peek()
+        if char == '{':
+            value = {}
+            for key in self.iter_object():
+                if key in skip_keys:
+                    self.skip_value()
+                else:
+                    value[key] = self.read_filtered_value(skip_keys)
+            return value
+        if char == '[':
+            return [self.read_filtered_value(skip_keys) for _ in self.iter_array()]
+        return self.read_value()
+
+    def _iter_members(self, open_char: str, close_char: str, with_keys: bool) -> Iterator[Any]:
+        self._expect(open_char)
+        if self._peek() == close_char:
+            self._pos += 1
+            return
+        while True:
+            if with_keys:
+                self._peek()
+                key = self.read_value()
+                self._expect(':')
+                self._peek()
+                yield key
+            else:
+                self._peek()
+                yield None
+            char = self._peek()
+            self._pos += 1
+            if char == close_char:
+                return
+            if char != ',':
+                raise JSONStreamError(f'expected "," or {close_char!r}, found {char!r}')
+
+    def iter_object(self) -> Iterator[str]:
+        return self._iter_members('{', '}', True)
+
+    def iter_array(self) -> Iterator[None]:
+        return self._iter_members('[', ']', False)
+
+
+def _open_containers(text: str) -> str:
+    # the closing characters of the containers text leaves open, from the innermost, or None when text ends in a
+    # string. Every step is a pass of str, bytes or re in C. Backslashes are only found in strings, once the escapes
+    # are dropped every quote opens or closes one. Then only the quotes and the structure are kept, two quotes next
+    # to each other are an empty string or the end and the start of two strings and go away together, what is left
+    # of the strings is dropped, and the structure is reduced by removing its empty pairs, one nesting level per pass
+    data = text.encode('utf-8', 'surrogatepass').replace(b'\\\\', b'').replace(b'\\"', b'')
+    data = _STRING.sub(b'', data.translate(None, _NOT_STRUCTURE).replace(b'""', b''))
+    if b'"' in data:
+        return None
+    while True:
+        reduced = data.replace(b'[]', b'').replace(b'{}', b'')
+        if len(reduced) == len(data):
+            break
+        data = reduced
+    if b']' in data or b'}' in data:
+        raise JSONStreamError('unbalanced JSON document')
+    return ''.join(_CLOSE[char] for char in reversed(data.decode()))
+
+
+def _string_start(text: str, end: int) -> int:
+    # the opening quote of the string text[:end] ends in: the last quote not escaped by an odd run of backslashes
+    while True:
+        end = text.rfind('"', 0, end)
+        backslash = end
+        while backslash > 0 and text[backslash - 1] == '\\':
+            backslash -= 1
+        if end < 0 or not (end - backslash) % 2:
+            return end
+
+
+def decode_prefix(text: str) -> Any:
+    # the value of a JSON document cut at some point, e.g. a response read up to a maximum size: the containers
+    # still open are closed after their last complete member. The cut is searched from the end of the text, at the
+    # last comma or closing character out of the strings, so that the members are decoded once, by json
+    end = len(text)
+    while end > 0:
+        cut = max(text.rfind(',', 0, end), text.rfind(']', 0, end), text.rfind('}', 0, end))
+        if cut < 0:
+            break
+        try:
+            closing = _open_containers(text[:cut])
+        except JSONStreamError:
+            break
+        if closing is None:
+            # in a string, the cut is before its opening quote
+            end = _string_start(text, cut)
+            continue
+        try:
+            if text[cut] == ',':
+                return json.loads(text[:cut] + closing)
+            return json.loads(text[:cut + 1] + closing[1:])
+        except ValueError:
+            # e.g. a complete document followed by something else
+            break
+    start = _WHITESPACE.match(text).end()
+    if start == len(text) or text[start] not in _CLOSE:
+        raise JSONStreamError('no complete value in the beginning of the JSON document')
+    try:
+        value, _ = _DECODER.raw_decode(text, start)
+        return value
+    except ValueError:
+        # no complete member, an empty container would be one more member with a made up structure
+        return json.loads(text[start] + _CLOSE[text[start]])
@@ -0,0 +1,152 @@
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+
+class EndpointMetrics:
+    def __init__(self, index: int, name: Union[str, None]):
+        self.index = index
+        self.name = name
+        self.method = None
+        self.path = None
+        # status of the first response, the live one when many samples are fetched
+        self.status = None
+        self.content_type = None
+        self.requests = 0
+        self.cache_hits = 0
+        self.bytes_received = 0
+        self.retries = 0
+        # requests answered by an identical one already in flight
+        self.coalesced = 0
+        self.fetch_seconds = 0.0
+        self.build_seconds = 0.0
+        self.components = None
+        self.failed = False
+        # where the response comes from when the endpoint missed the deadline
+        self.fallback = None
+        # responses cut at the maximum size and responses with a body that is not JSON
+        self.truncated = 0
+        self.non_json = 0
+        # responses with a status other than 2xx, documented under their status
+        self.error_responses = 0
+
+    def record_response(self,
+                        status: Union[int, None],
+                        size: int,
+                        cached: bool = False,
+                        content_type: Union[str, None] = None):
+        if self.status is None:
+            self.status = status
+            self.content_type = content_type
+        self.requests += 1
+        self.cache_hits += int(cached)
+        self.bytes_received += size
+
+    @property
+    def total_seconds(self) -> float:
+        return self.fetch_seconds + self.build_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'index': self.index,
+            'name': self.name,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'content_type': self.content_type,
+            'requests': self.requests,
+            'cache_hits': self.cache_hits,
+            'bytes_received': self.bytes_received,
+            'retries': self.retries,
+            'coalesced': self.coalesced,
+            'fetch_seconds': self.fetch_seconds,
+            'build_seconds': self.build_seconds,
+            'components': self.components,
+            'failed': self.failed,
+            'fallback': self.fallback,
+            'truncated': self.truncated,
+            'non_json': self.non_json,
+            'error_responses': self.error_responses
+        }
+
+
+# the metrics of the endpoint the running task is building, read by the HTTP client
+_current_endpoint = ContextVar('current_endpoint', default=None)
+
+
+def current_endpoint() -> Union[EndpointMetrics, None]:
+    return _current_endpoint.get()
+
+
+def set_current_endpoint(endpoint_metrics: Union[EndpointMetrics, None]):
+    _current_endpoint.set(endpoint_metrics)
+
+
+def timed_call(function: Callable, *args) -> Tuple[Any, float]:
+    # module level, so that it can be sent to a process pool
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+# Wall time of the stages of a run and what happened to every endpoint. Stages that run many times, once
+# per endpoint or per path, are summed
+class RunMetrics:
+    SLOWEST = 10
+
+    def __init__(self):
+        self.stages = {}
+        self.endpoints = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def endpoint(self, index: int, name: Union[str, None] = None) -> EndpointMetrics:
+        endpoint_metrics = self.endpoints.get(index)
+        if endpoint_metrics is None:
+            endpoint_metrics = self.endpoints[index] = EndpointMetrics(index, name)
+        return endpoint_metrics
+
+    def built_endpoints(self, names: List[str]) -> List[EndpointMetrics]:
+        # the endpoints failed while fetching are not in the document, the metrics of the others follow its order
+        built = [self.endpoints[index] for index in sorted(self.endpoints) if not self.endpoints[index].failed]
+        if len(built) != len(names):
+            built = [self.endpoint(index, name) for index, name in enumerate(names)]
+        return built
+
+    def report(self, slowest: int = SLOWEST) -> Dict[str, Any]:
+        endpoints = [self.endpoints[index] for index in sorted(self.endpoints)]
+        return {
+            'total_seconds': time.perf_counter() - self._start,
+            'stages': self.stages,
+            'endpoints': len(endpoints),
+            'failed_endpoints': sum(endpoint.failed for endpoint in endpoints),
+            'requests': sum(endpoint.requests for endpoint in endpoints),
+            'cache_hits': sum(endpoint.cache_hits for endpoint in endpoints),
+            'bytes_received': sum(endpoint.bytes_received for endpoint in endpoints),
+            'retries': sum(endpoint.retries for endpoint in endpoints),
+            'coalesced': sum(endpoint.coalesced for endpoint in endpoints),
+            'fallbacks': sum(endpoint.fallback is not None for endpoint in endpoints),
+            'truncated_responses': sum(endpoint.truncated for endpoint in endpoints),
+            'non_json_responses': sum(endpoint.non_json for endpoint in endpoints),
+            'error_responses': sum(endpoint.error_responses for endpoint in endpoints),
+            'slowest': [endpoint.to_dict() for endpoint in
+                        sorted(endpoints, key=lambda endpoint: endpoint.total_seconds, reverse=True)[:slowest]],
+            'endpoint_metrics': [endpoint.to_dict() for endpoint in endpoints]
+        }
+
+    def save(self, path: Union[str, Path]):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
@@ -1,28 +1,32 @@
+import os
+from http import HTTPStatus
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import List, Any, Dict, Union, Tuple
-
-import yaml
-from genson import SchemaBuilder
+from typing import TYPE_CHECKING, List, Any, Dict, Union, Tuple
 
 from .apidoc import Endpoint, APIDoc
+from .emitter import create_emitter, FORMAT_YAML, FORMAT_JSON
+from .incremental import IncrementalState
+from .metrics import RunMetrics, timed_call
+from .inference import ENGINE_NATIVE, SchemaInferrer, create_schema_builder, scalar_schemas
+from .options import GenerationOptions
 from .postmanapidoc import PostmanAPIDoc
+from .sampling import SamplingPolicy
+from .schemas import REF_PREFIX, SchemaMemo, content_hash, unique_name
+from .writer import DocumentWriter
 
-
-def str_presenter(dumper, data):
-    if len(data.splitlines()) > 1:  # check for multiline string
-        return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='|')
-    return dumper.represent_scalar('tag:yaml.org,2002:str', data)
-
-
-yaml.add_representer(str, str_presenter)
+if TYPE_CHECKING:
+    from genson import SchemaBuilder
 
 
 class OpenAPIDoc(APIDoc):
     class OpenAPIEndpoint(Endpoint):
+        __slots__ = ()
 
         _PREFIX_COMPONENTS_SCHEMAS = '#/components/schemas/'
         _PREFIX_COMPONENTS_RESPONSES = '#/components/responses/'
-        _REF_PREFIX = '#/components/schemas/'
+        _REF_PREFIX = REF_PREFIX
 
         def __init__(self,
                      *,
@@ -33,7 +37,12 @@ class OpenAPIDoc(APIDoc):
                      request_query_params: Union[Dict[str, Any], None],
                      request_path_params: Union[Dict[str, Any], None],
                      request_body: Union[Dict[str, Any], None],
-                     response_example: Dict[str, Any]):
+                     response_example: Dict[str, Any],
+                     fingerprint: Union[str, None] = None,
+                     prebuilt: Union[Tuple[Dict[str, Any], Dict[str, Any]], None] = None,
+                     response_builder: Any = None,
+                     response_key: Union[str, None] = None,
+                     other_responses: Union[Dict[str, Any], None] = None):
             super().__init__(name=name,
                              path=path,
                              method=method,
@@ -41,82 +50,201 @@ class OpenAPIDoc(APIDoc):
                              request_query_params=request_query_params,
                              request_path_params=request_path_params,
                              request_body=request_body,
-                             response_example=response_example)
+                             response_example=response_example,
+                             fingerprint=fingerprint,
+                             prebuilt=prebuilt,
+                             response_builder=response_builder,
+                             response_key=response_key,
+                             other_responses=other_responses)
+
+        @classmethod
+        def from_endpoint(cls, endpoint: Endpoint):
+            # a new OpenAPIEndpoint holding the values of endpoint, left as it is. The subclasses only have the slots
+            # of Endpoint, the values are shared and not copied, so the payloads stay spilled if they are
+            openapi_endpoint = cls.__new__(cls)
+            for slot in Endpoint.__slots__:
+                setattr(openapi_endpoint, slot, getattr(endpoint, slot))
+            return openapi_endpoint
+
+        @staticmethod
+        def _is_open(json_schema: Dict[str, Any]) -> bool:
+            # an object cut by the sampling and never seen whole, nothing is known about its properties
+            return json_schema.get('additionalProperties') is True and not json_schema.get('properties')
+
+        @staticmethod
+        def _schema_parts(json_schema: Dict[str, Any]) -> Tuple[List[str], Union[Dict[str, Any], None],
+                                                                Union[Dict[str, Any], None]]:
+            # the scalar types, the object schema and the array schema of a value: genson describes a value seen
+            # with many kinds of types by an anyOf of one schema for each kind, and many scalar types by a list
+            types = []
+            object_schema = None
+            array_schema = None
+            for part in json_schema.get('anyOf', [json_schema]):
+                part_types = part.get('type')
+                if not isinstance(part_types, list):
+                    part_types = [part_types]
+                for part_type in part_types:
+                    # e.g. an empty object seen with strings is an object in a list of types
+                    kind_schema = part if len(part_types) == 1 else dict(part, type=part_type)
+                    if part_type == 'object':
+                        object_schema = kind_schema
+                    elif part_type == 'array':
+                        array_schema = kind_schema
+                    elif part_type is not None:
+                        types.append(part_type)
+            return types, object_schema, array_schema
+
+        @staticmethod
+        def _ref(name: str) -> Dict[str, str]:
+            return {'$ref': f'{OpenAPIDoc.OpenAPIEndpoint._REF_PREFIX}{name}'}
+
+        @staticmethod
+        def _array_schema(json_schema: Dict[str, Any],
+                          prop_name: str,
+                          prefix: str,
+                          items_name: str,
+                          schemas: Dict[str, Any]) -> Dict[str, Any]:
+            if 'items' not in json_schema:
+                print(f'WARNING: Can not determine items type of {prop_name} in {prefix} default choose string type')
+                return {'type': 'array', 'items': {'type': 'string'}}
+            items = json_schema['items']
+            if not items:
+                # an array cut by the sampling, its items can be anything
+                return {'type': 'array'}
+            types, object_schema, array_schema = OpenAPIDoc.OpenAPIEndpoint._schema_parts(items)
+            if set(types) <= {'null'} and (object_schema is None) != (array_schema is None):
+                items_schema = OpenAPIDoc.OpenAPIEndpoint._ref(OpenAPIDoc.OpenAPIEndpoint._split_schema_in_subschemas(
+                    items, prefix, items_name, schemas))
+            else:
+                items_schema = OpenAPIDoc.OpenAPIEndpoint._mixed_schema(items, prop_name, prefix, items_name,
+                                                                        schemas)
+            return {'type': 'array', 'items': items_schema}
+
+        @staticmethod
+        def _mixed_schema(json_schema: Dict[str, Any],
+                          prop_name: str,
+                          prefix: str,
+                          name: str,
+                          schemas: Dict[str, Any]) -> Dict[str, Any]:
+            # OpenAPI 3.0 has neither a null type nor lists of types, the kinds of the value are the alternatives of
+            # an anyOf, as the native engine does
+            types, object_schema, array_schema = OpenAPIDoc.OpenAPIEndpoint._schema_parts(json_schema)
+            if not types and object_schema is None and array_schema is None:
+                # e.g. the items of an array cut by the sampling, they can be anything
+                return json_schema
+            if set(types) == {'null'} and (object_schema is not None or array_schema is not None):
+                # as for objects and arrays alone, a value sometimes null is described by its non null shapes
+                types = []
+            alternatives = scalar_schemas(types) if types else []
+            if object_schema is not None:
+                alternatives.append(OpenAPIDoc.OpenAPIEndpoint._ref(
+                    OpenAPIDoc.OpenAPIEndpoint._split_schema_in_subschemas(object_schema, prefix, name, schemas)))
+            if array_schema is not None:
+                alternatives.append(OpenAPIDoc.OpenAPIEndpoint._array_schema(array_schema, prop_name, prefix,
+                                                                             f'{name}Item', schemas))
+            if len(alternatives) == 1:
+                return alternatives[0]
+            return {'anyOf': alternatives}
+
+        @staticmethod
+        def _property_schema(json_schema: Dict[str, Any],
+                             prop_name: str,
+                             prefix: str,
+                             schemas: Dict[str, Any]) -> Dict[str, Any]:
+            sub_component_name = f'{prefix}{prop_name[:1].capitalize() + prop_name[1:]}'
+            types, object_schema, array_schema = OpenAPIDoc.OpenAPIEndpoint._schema_parts(json_schema)
+            if set(types) <= {'null'} and object_schema is not None and array_schema is None:
+                if OpenAPIDoc.OpenAPIEndpoint._is_open(object_schema):
+                    # an object cut by the sampling and never seen whole, nothing is known about its properties
+                    return {'type': 'object'}
+                return OpenAPIDoc.OpenAPIEndpoint._ref(OpenAPIDoc.OpenAPIEndpoint._split_schema_in_subschemas(
+                    object_schema, prefix, sub_component_name, schemas))
+            if set(types) <= {'null'} and array_schema is not None and object_schema is None:
+                return OpenAPIDoc.OpenAPIEndpoint._array_schema(array_schema, prop_name, prefix, sub_component_name,
+                                                                schemas)
+            if types == ['null'] and object_schema is None and array_schema is None:
+                return {'type': 'object'}
+            return OpenAPIDoc.OpenAPIEndpoint._mixed_schema(json_schema, prop_name, prefix, sub_component_name,
+                                                            schemas)
 
         @staticmethod
         def _split_schema_in_subschemas(json_schema: Dict[str, Any],
-                                        prefix: str, schema_name, schemas):
-            properties = {}
-            if json_schema['type'] == 'object':
-                props = json_schema['properties']
+                                        prefix: str, schema_name, schemas) -> str:
+            # returns the name the schema has been stored with, different from schema_name on a name clash. A value
+            # sometimes null is described by its non null shape, a value of many kinds by an anyOf of them
+            types, object_schema, array_schema = OpenAPIDoc.OpenAPIEndpoint._schema_parts(json_schema)
+            if set(types) <= {'null'} and object_schema is not None and array_schema is None:
+                properties = {}
+                props = object_schema.get('properties', {})
                 for prop_name in props:
-                    if props[prop_name]['type'] == 'object':
-                        sub_component_name = f'{prefix}{prop_name[0].capitalize() + prop_name[1:]}'
-                        properties[prop_name] = {
-                            '$ref': f'{OpenAPIDoc.OpenAPIEndpoint._REF_PREFIX}{sub_component_name}'
-                        }
-                        OpenAPIDoc.OpenAPIEndpoint._split_schema_in_subschemas(props[prop_name], prefix, sub_component_name,
-                                                                               schemas)
-                    elif props[prop_name]['type'] == 'array' and 'items' not in props[prop_name]:
-                        print(
-                            f'WARNING: Can not determine items type of {prop_name} in {prefix} default choose string type')
-                        properties[prop_name] = props[prop_name]
-                        properties[prop_name]['items'] = {'type': 'string'}
-                    elif props[prop_name]['type'] == 'array' and (
-                            props[prop_name]['items']['type'] == 'array' or props[prop_name]['items']['type'] == 'object'):
-                        sub_component_name = f'{prefix}{prop_name[0].capitalize() + prop_name[1:]}'
-                        properties[prop_name] = {
-                            'type': 'array',
-                            'items': {
-                                '$ref': f'{OpenAPIDoc.OpenAPIEndpoint._REF_PREFIX}{sub_component_name}'
-                            }
-                        }
-                        OpenAPIDoc.OpenAPIEndpoint._split_schema_in_subschemas(props[prop_name]['items'], prefix,
-                                                                               sub_component_name, schemas)
-                    elif props[prop_name]['type'] == 'null':
-                        properties[prop_name] = {'type': 'object'}
-                    else:
-                        properties[prop_name] = props[prop_name]
-
-                if schema_name in schemas:
-                    print(f'WARNING: {schema_name} is already present in schemas please fix it manually')
-                schemas[schema_name] = dict()
+                    properties[prop_name] = OpenAPIDoc.OpenAPIEndpoint._property_schema(props[prop_name], prop_name,
+                                                                                        prefix, schemas)
+                schema = dict()
                 # if 'required' in json_schema:
-                #     schemas[schema_name]['required'] = json_schema['required']
-                schemas[schema_name]['type'] = json_schema['type']
-                schemas[schema_name]['properties'] = properties
-                schemas[schema_name]['additionalProperties'] = False
+                #     schema['required'] = json_schema['required']
+                schema['type'] = 'object'
+                if properties or not object_schema.get('additionalProperties'):
+                    schema['properties'] = properties
+                if not object_schema.get('additionalProperties'):
+                    schema['additionalProperties'] = False
+            elif set(types) <= {'null'} and array_schema is not None and object_schema is None:
+                schema = OpenAPIDoc.OpenAPIEndpoint._array_schema(array_schema, prefix, prefix, f'{prefix}Item',
+                                                                  schemas)
             else:
-                OpenAPIDoc.OpenAPIEndpoint._split_schema_in_subschemas(json_schema['items'], prefix, f'{prefix}Item', schemas)
-                schemas[schema_name] = {
-                            'type': 'array',
-                            'items': {
-                                '$ref': f'{OpenAPIDoc.OpenAPIEndpoint._REF_PREFIX}{prefix}Item'
-                            }
-                }
+                schema = OpenAPIDoc.OpenAPIEndpoint._mixed_schema(json_schema, prefix, prefix, schema_name, schemas)
+            # same names are deduplicated when the schemas are merged in the document
+            schema_name = unique_name(schema_name, schemas)
+            schemas[schema_name] = schema
+            return schema_name
+
+        @staticmethod
+        def generate_schemas_from_builder(prefix: str,
+                                          builder: Union[SchemaInferrer, 'SchemaBuilder']) -> Dict[str, Any]:
+            if isinstance(builder, SchemaInferrer):
+                return builder.to_components(prefix)
+            json_schema = builder.to_schema()
+            del json_schema['$schema']
+            schemas = {}
+            OpenAPIDoc.OpenAPIEndpoint._split_schema_in_subschemas(json_schema, prefix,
+                                                                   prefix, schemas)
+            return schemas
 
         @staticmethod
         def generate_schemas_from_example(prefix: str,
-                                          example: Dict[str, Any]) -> Dict[str, Any]:
+                                          example: Dict[str, Any],
+                                          schema_engine: str = ENGINE_NATIVE,
+                                          sampling: Union[SamplingPolicy, None] = None) -> Dict[str, Any]:
             if example:
-                builder = SchemaBuilder()
+                if sampling is not None:
+                    example = sampling.sample(example)
+                builder = create_schema_builder(schema_engine)
                 builder.add_object(example)
-                json_schema = builder.to_schema()
-                del json_schema['$schema']
-                schemas = {}
-                OpenAPIDoc.OpenAPIEndpoint._split_schema_in_subschemas(json_schema, prefix,
-                                                                       prefix, schemas)
-                return schemas
+                return OpenAPIDoc.OpenAPIEndpoint.generate_schemas_from_builder(prefix, builder)
             return {}
 
         @property
         def request_schemas(self) -> Dict[str, Any]:
+            return self.get_request_schemas()
+
+        def get_request_schemas(self,
+                                schema_engine: str = ENGINE_NATIVE,
+                                sampling: Union[SamplingPolicy, None] = None,
+                                request_body: Any = None) -> Dict[str, Any]:
+            request_body = self.request_body if request_body is None else request_body
             cap_name = f'{self.name[0].capitalize()}{self.name[1:]}'
             cap_method = f'{self.method[0].capitalize()}{self.method[1:]}'
             request_schema_ref = f'{cap_method}{cap_name}Request'
-            return OpenAPIDoc.OpenAPIEndpoint.generate_schemas_from_example(request_schema_ref, self.request_body)
+            return OpenAPIDoc.OpenAPIEndpoint.generate_schemas_from_example(request_schema_ref, request_body,
+                                                                            schema_engine, sampling)
+
+        @staticmethod
+        def _get_example(example: Any, options: Union[GenerationOptions, None]) -> Any:
+            return example if options is None else options.trim_example(example)
 
-        def _get_response_200(self) -> Dict[str, Any]:
+        def _get_response_200(self,
+                              options: Union[GenerationOptions, None] = None,
+                              response_example: Any = None) -> Dict[str, Any]:
+            response_example = self.response_example if response_example is None else response_example
             return {
                 'description': 'OK',
                 'content': {
@@ -124,7 +252,30 @@ class OpenAPIDoc(APIDoc):
                         'schema': {
                             '$ref': f'{OpenAPIDoc.OpenAPIEndpoint._PREFIX_COMPONENTS_SCHEMAS}{self.method[0].capitalize()}{self.method[1:]}{self.name[0].capitalize()}{self.name[1:]}Response'
                         },
-                        'example': self.response_example
+                        'example': OpenAPIDoc.OpenAPIEndpoint._get_example(response_example, options)
+                    }
+                }
+            }
+
+        def _get_other_response(self,
+                                code: str,
+                                example: Any,
+                                options: Union[GenerationOptions, None] = None) -> Dict[str, Any]:
+            try:
+                description = HTTPStatus(int(code)).phrase
+            except ValueError:
+                description = f'Response {code}'
+            if not example:
+                # no schema is inferred from an empty example
+                return {'description': description}
+            return {
+                'description': description,
+                'content': {
+                    'application/json': {
+                        'schema': {
+                            '$ref': f'{OpenAPIDoc.OpenAPIEndpoint._PREFIX_COMPONENTS_SCHEMAS}{self.method[0].capitalize()}{self.method[1:]}{self.name[0].capitalize()}{self.name[1:]}Response{code}'
+                        },
+                        'example': OpenAPIDoc.OpenAPIEndpoint._get_example(example, options)
                     }
                 }
             }
@@ -146,7 +297,10 @@ class OpenAPIDoc(APIDoc):
 
             return parameters
 
-        def _get_request_body(self) -> Dict[str, Any]:
+        def _get_request_body(self,
+                              options: Union[GenerationOptions, None] = None,
+                              request_body: Any = None) -> Dict[str, Any]:
+            request_body = self.request_body if request_body is None else request_body
             return {
                 'content':
                     {
@@ -156,14 +310,16 @@ class OpenAPIDoc(APIDoc):
                                     {
                                         '$ref': f'{OpenAPIDoc.OpenAPIEndpoint._PREFIX_COMPONENTS_SCHEMAS}{self.method[0].capitalize()}{self.method[1:]}{self.name[0].capitalize()}{self.name[1:]}Request'
                                     },
-                                'example': self.request_body
+                                'example': OpenAPIDoc.OpenAPIEndpoint._get_example(request_body, options)
                             }
                     },
                 'required': True
             }
 
         def _insert_request_struct(self,
-                                   openapi_path: Dict[str, Any]):
+                                   openapi_path: Dict[str, Any],
+                                   options: Union[GenerationOptions, None] = None,
+                                   request_body: Any = None):
             if self.request_query_params or self.request_path_params:
                 openapi_path['parameters'] = []
                 if self.request_query_params:
@@ -172,75 +328,192 @@ class OpenAPIDoc(APIDoc):
                 if self.request_path_params:
                     openapi_path['parameters'].extend(self._get_parameters('path'))
 
-            if self.request_body:
-                request_body = self._get_request_body()
-                openapi_path['requestBody'] = request_body
+            # the stored value is checked, a spilled body is never empty and is not inflated just to know that
+            if self._request_body:
+                openapi_path['requestBody'] = self._get_request_body(options, request_body)
 
         def _insert_responses_struct(self,
-                                     openapi_path: Dict[str, Any]):
+                                     openapi_path: Dict[str, Any],
+                                     options: Union[GenerationOptions, None] = None,
+                                     response_example: Any = None):
             responses = dict()
-            responses['200'] = self._get_response_200()
+            # the stored value is checked, a spilled example is not inflated just to know that there is one
+            if self._response_example is None and self.response_builder is None:
+                # no response has been received, the endpoint is described only by its request
+                responses['200'] = {'description': 'OK'}
+            else:
+                responses['200'] = self._get_response_200(options, response_example)
+            for code, example in sorted((self.other_responses or {}).items()):
+                responses[code] = self._get_other_response(code, example, options)
 
             openapi_path['responses'] = responses
 
-        def get_openapi_path(self) -> Dict[str, Any]:
+        def get_openapi_path(self,
+                             options: Union[GenerationOptions, None] = None,
+                             response_example: Any = None,
+                             request_body: Any = None) -> Dict[str, Any]:
+            # response_example and request_body are the payloads already inflated by the caller, read from the
+            # endpoint if None
             openapi_path = dict()
             openapi_path[self.path] = {}
             openapi_path[self.path][self.method] = {}
             if self.tags:
                 openapi_path[self.path][self.method]['tags'] = list(self.tags)
-            self._insert_request_struct(openapi_path[self.path][self.method])
-            self._insert_responses_struct(openapi_path[self.path][self.method])
+            self._insert_request_struct(openapi_path[self.path][self.method], options, request_body)
+            self._insert_responses_struct(openapi_path[self.path][self.method], options, response_example)
             return openapi_path
 
+    # one for every process building the schemas
+    _response_schemas = SchemaMemo()
+
+    def __init__(self,
+                 name: str,
+                 endpoints: List[Endpoint],
+                 options: Union[GenerationOptions, None] = None):
+        super().__init__(name, endpoints)
+        self.options = GenerationOptions() if options is None else options
+
+    @property
+    def options(self) -> GenerationOptions:
+        return self._options
+
+    @options.setter
+    def options(self, options: GenerationOptions):
+        self._options = options
+
     @staticmethod
-    def _build_path_and_endpoint_schemas(endpoint: OpenAPIEndpoint) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    def _build_path_and_endpoint_schemas(endpoint: OpenAPIEndpoint,
+                                         options: Union[GenerationOptions, None] = None) \
+            -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        options = GenerationOptions() if options is None else options
         cap_name = f'{endpoint.name[0].capitalize()}{endpoint.name[1:]}'
         cap_method = f'{endpoint.method[0].capitalize()}{endpoint.method[1:]}'
 
         schemas = {}
-        if endpoint.request_body:
-            schemas.update(endpoint.request_schemas)
+        # both payloads are inflated once, for the schemas and the examples of the operation
+        request_body = endpoint.request_body
+        if request_body:
+            schemas.update(endpoint.get_request_schemas(options.schema_engine, options.sampling, request_body))
 
         response_schema_ref = f'{cap_method}{cap_name}Response'
-        response_schema = OpenAPIDoc.OpenAPIEndpoint.generate_schemas_from_example(response_schema_ref,
-                                                                                   endpoint.response_example)
+        response_example = endpoint.response_example
+        if endpoint.response_builder is not None:
+            # the schema of many responses merged during the fetch
+            response_schema = OpenAPIDoc.OpenAPIEndpoint.generate_schemas_from_builder(response_schema_ref,
+                                                                                       endpoint.response_builder)
+        else:
+            def build():
+                return OpenAPIDoc.OpenAPIEndpoint.generate_schemas_from_example(response_schema_ref,
+                                                                                response_example,
+                                                                                options.schema_engine,
+                                                                                options.sampling)
+
+            if endpoint.response_key is None:
+                response_schema = build()
+            else:
+                # endpoints calling the same request share its response, its schemas are inferred once
+                key = endpoint.response_key, content_hash(response_example), options.key()
+                response_schema = OpenAPIDoc._response_schemas.components(key, response_schema_ref, build)
         schemas.update(response_schema)
-        return endpoint.get_openapi_path(), schemas
+        for code, example in sorted((endpoint.other_responses or {}).items()):
+            schemas.update(OpenAPIDoc.OpenAPIEndpoint.generate_schemas_from_example(f'{response_schema_ref}{code}',
+                                                                                    example,
+                                                                                    options.schema_engine,
+                                                                                    options.sampling))
+        return endpoint.get_openapi_path(options, response_example, request_body), schemas
 
     @classmethod
     def create_from_postman_doc(cls,
-                                openapi_doc: PostmanAPIDoc):
+                                openapi_doc: PostmanAPIDoc,
+                                options: Union[GenerationOptions, None] = None):
+        # openapi_doc is left unchanged, its endpoints and the OpenAPIEndpoint made from them share their payloads
         return cls(openapi_doc.name,
-                   [OpenAPIDoc.OpenAPIEndpoint(name=endpoint.name,
-                                               path=endpoint.path,
-                                               method=endpoint.method,
-                                               tags=endpoint.tags,
-                                               request_query_params=endpoint.request_query_params,
-                                               request_path_params=endpoint.request_path_params,
-                                               request_body=endpoint.request_body,
-                                               response_example=endpoint.response_example) for endpoint in
-                    openapi_doc.endpoints])
-
-    def to_yaml(self, file_path: Path):
-        openapi_doc = {
+                   [OpenAPIDoc.OpenAPIEndpoint.from_endpoint(endpoint) for endpoint in openapi_doc.endpoints],
+                   options)
+
+    @staticmethod
+    def document_header(title: str) -> Dict[str, Any]:
+        return {
             "openapi": "3.0.2",
             "info": {
-                "title": self.name,
+                "title": title,
                 "version": "0.5.0"
-            },
-            "paths": {},
-            "components": {
-                "schemas": {}
             }
         }
-        for endpoint in self.endpoints:
-            path, endpoint_schemas = OpenAPIDoc._build_path_and_endpoint_schemas(endpoint)
-            if endpoint.path in openapi_doc["paths"]:
-                openapi_doc["paths"][endpoint.path].update(path[endpoint.path])
-            else:
-                openapi_doc['paths'].update(path)
-            openapi_doc['components']['schemas'].update(endpoint_schemas)
 
-        with open(file_path, 'w') as f:
-            f.write(yaml.dump(openapi_doc, sort_keys=False))
+    @staticmethod
+    def _build_operation_and_endpoint_schemas(endpoint: OpenAPIEndpoint,
+                                              options: GenerationOptions) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        if endpoint.prebuilt:
+            return endpoint.prebuilt
+        path, endpoint_schemas = OpenAPIDoc._build_path_and_endpoint_schemas(endpoint, options)
+        return path[endpoint.path][endpoint.method], endpoint_schemas
+
+    @staticmethod
+    def resolve_jobs(jobs: int) -> int:
+        # 0 jobs means one for every core
+        return jobs or os.cpu_count() or 1
+
+    def write(self,
+              file_path: Path,
+              output_format: str = FORMAT_YAML,
+              incremental: bool = False,
+              jobs: int = 1,
+              metrics: Union[RunMetrics, None] = None,
+              split: bool = False):
+        metrics = RunMetrics() if metrics is None else metrics
+        state = IncrementalState(settings=self.options.key()) if incremental else None
+        jobs = OpenAPIDoc.resolve_jobs(jobs)
+        pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+        # written aside and moved in place when complete, a failed run leaves the previous output untouched
+        target_path = f'{file_path}.tmp'
+        try:
+            with open(target_path, 'w', encoding='utf-8') as f:
+                writer = DocumentWriter(create_emitter(output_format, f, file_path if split else None),
+                                        [endpoint.path for endpoint in self.endpoints],
+                                        state)
+                writer.start(OpenAPIDoc.document_header(self.name))
+                build = repeat(OpenAPIDoc._build_operation_and_endpoint_schemas)
+                if pool is None:
+                    fragments = map(timed_call, build, self.endpoints, repeat(self.options))
+                else:
+                    # results come back in the order of the endpoints, so the document is the same of a serial run
+                    fragments = pool.map(timed_call, build, self.endpoints, repeat(self.options),
+                                         chunksize=max(1, len(self.endpoints) // (jobs * 4)))
+                endpoints_metrics = metrics.built_endpoints([endpoint.name for endpoint in self.endpoints])
+                for index, (endpoint, endpoint_metrics, (fragment, seconds)) in enumerate(zip(self.endpoints,
+                                                                                             endpoints_metrics,
+                                                                                             fragments)):
+                    endpoint_metrics.build_seconds = seconds
+                    endpoint_metrics.components = len(fragment[1])
+                    metrics.add_time('build', seconds)
+                    with metrics.stage('emit'):
+                        writer.add(index, endpoint.method, endpoint.fingerprint, fragment)
+                with metrics.stage('emit'):
+                    writer.end()
+        except BaseException:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            raise
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        os.replace(target_path, file_path)
+        if incremental:
+            state.save(file_path)
+
+    def to_yaml(self,
+                file_path: Path,
+                incremental: bool = False,
+                jobs: int = 1,
+                metrics: Union[RunMetrics, None] = None,
+                split: bool = False):
+        self.write(file_path, FORMAT_YAML, incremental, jobs, metrics, split)
+
+    def to_json(self,
+                file_path: Path,
+                incremental: bool = False,
+                jobs: int = 1,
+                metrics: Union[RunMetrics, None] = None,
+                split: bool = False):
+        self.write(file_path, FORMAT_JSON, incremental, jobs, metrics, split)
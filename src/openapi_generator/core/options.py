@@ -0,0 +1,56 @@
+import json
+from typing import Any, Union
+
+from .common import truncate_string
+from .inference import ENGINE_NATIVE, ENGINES
+from .sampling import SamplingPolicy
+
+SOURCE_LIVE = 'live'
+SOURCE_SAVED_EXAMPLES = 'saved-examples'
+SOURCE_SAVED_THEN_LIVE = 'saved-then-live'
+RESPONSE_SOURCES = (SOURCE_LIVE, SOURCE_SAVED_EXAMPLES, SOURCE_SAVED_THEN_LIVE)
+
+
+class GenerationOptions:
+    def __init__(self,
+                 *,
+                 schema_engine: str = ENGINE_NATIVE,
+                 sampling: Union[SamplingPolicy, None] = None,
+                 example_max_items: Union[int, None] = None,
+                 example_max_length: Union[int, None] = None,
+                 samples: int = 1,
+                 response_source: str = SOURCE_LIVE):
+        if schema_engine not in ENGINES:
+            raise ValueError(f'Unknown schema engine {schema_engine}, choose one of {", ".join(ENGINES)}')
+        if response_source not in RESPONSE_SOURCES:
+            raise ValueError(f'Unknown response source {response_source}, '
+                             f'choose one of {", ".join(RESPONSE_SOURCES)}')
+        self.schema_engine = schema_engine
+        self.sampling = SamplingPolicy() if sampling is None else sampling
+        self.example_max_items = example_max_items
+        self.example_max_length = example_max_length
+        # responses merged in the schema of every endpoint
+        self.samples = samples
+        # where the response examples come from: the service, the examples saved in the collection or both
+        self.response_source = response_source
+
+    @property
+    def uses_saved_examples(self) -> bool:
+        return self.response_source != SOURCE_LIVE
+
+    def key(self) -> str:
+        # identifies the options that change the generated paths and schemas
+        return json.dumps({
+            'schema_engine': self.schema_engine,
+            'sampling': self.sampling.key(),
+            'example_max_items': self.example_max_items,
+            'example_max_length': self.example_max_length,
+            'samples': self.samples,
+            'response_source': self.response_source
+        }, sort_keys=True)
+
+    def trim_example(self, example: Any) -> Any:
+        # arrays and long strings of the examples embedded in the document are cut, schemas are inferred before
+        if self.example_max_items is None and self.example_max_length is None:
+            return example
+        return truncate_string(example, self.example_max_length, self.example_max_items)
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Any, Union
+
+
+class SpilledPayload:
+    __slots__ = ('_data', '_path', '_offset', '_length')
+
+    def __init__(self,
+                 data: Union[bytes, None] = None,
+                 path: Union[str, None] = None,
+                 offset: int = 0,
+                 length: int = 0):
+        # the compressed JSON of the payload, kept in memory or in the file of the store
+        self._data = data
+        self._path = path
+        self._offset = offset
+        self._length = length
+
+    def load(self) -> Any:
+        data = self._data
+        if data is None:
+            # opened by path, so that a payload sent to another process can be read there too
+            with open(self._path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read(self._length)
+        return json.loads(zlib.decompress(data))
+
+
+def inflate(value: Any) -> Any:
+    return value.load() if isinstance(value, SpilledPayload) else value
+
+
+# Keeps the large request bodies and response examples compressed until they are needed, in memory or, with a
+# directory, in a temporary file there. Payloads come from JSON, so they are stored as JSON without any loss
+class PayloadStore:
+    DEFAULT_THRESHOLD = 64 * 1024
+    _COMPRESSION_LEVEL = 1
+
+    def __init__(self,
+                 *,
+                 threshold: int = DEFAULT_THRESHOLD,
+                 directory: Union[str, Path, None] = None):
+        # bytes of JSON above which a payload is spilled
+        self.threshold = threshold
+        self.directory = directory
+        self._path = None
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def put(self, value: Any) -> Any:
+        # the value itself if small or empty, else a SpilledPayload: a stored payload is empty only if its value is
+        if not value or isinstance(value, (SpilledPayload, str, int, float, bool)):
+            return value
+        data = json.dumps(value).encode()
+        if len(data) < self.threshold:
+            return value
+        data = zlib.compress(data, PayloadStore._COMPRESSION_LEVEL)
+        if self.directory is None:
+            return SpilledPayload(data)
+        if self._file is None:
+            descriptor, self._path = tempfile.mkstemp(suffix='.payloads', dir=self.directory)
+            self._file = os.fdopen(descriptor, 'wb')
+        offset = self._file.tell()
+        self._file.write(data)
+        self._file.flush()
+        return SpilledPayload(path=self._path, offset=offset, length=len(data))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            os.remove(self._path)
+            self._file = None
+            self._path = None
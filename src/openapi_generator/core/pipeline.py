@@ -0,0 +1,236 @@
+import asyncio
+import filecmp
+import os
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Union
+
+from .apidoc import Endpoint
+from .cache import ResponseCache
+from .client import HTTPClient
+from .emitter import create_emitter, FORMAT_YAML
+from .incremental import IncrementalState
+from .metrics import RunMetrics, timed_call
+from .openapidoc import OpenAPIDoc
+from .options import GenerationOptions
+from .payloads import PayloadStore
+from .postmanapidoc import PostmanAPIDoc
+from .ratelimit import RateLimiter, RetryPolicy
+from .writer import DocumentWriter
+
+
+# Generates the openapi doc while the collection is fetched instead of after it: every endpoint goes through
+# schema inference as soon as its response arrives, its operation is handed to the DocumentWriter and the raw
+# response is released. The output is the same of PostmanAPIDoc.factory followed by OpenAPIDoc.write
+class GenerationPipeline:
+    def __init__(self,
+                 path_postman_collection: Path,
+                 path_postman_environment: Path,
+                 *,
+                 limit: int = HTTPClient.DEFAULT_LIMIT,
+                 limit_per_host: int = HTTPClient.DEFAULT_LIMIT_PER_HOST,
+                 dns_cache_ttl: Union[int, None] = HTTPClient.DEFAULT_DNS_CACHE_TTL,
+                 cache: Union[ResponseCache, None] = None,
+                 rate_limiter: Union[RateLimiter, None] = None,
+                 retry_policy: Union[RetryPolicy, None] = None,
+                 connect_timeout: Union[float, None] = HTTPClient.DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: Union[float, None] = HTTPClient.DEFAULT_READ_TIMEOUT,
+                 max_body_size: Union[int, None] = HTTPClient.DEFAULT_MAX_BODY_SIZE,
+                 deadline: Union[float, None] = None,
+                 stream: bool = False,
+                 options: Union[GenerationOptions, None] = None,
+                 jobs: int = 1,
+                 executor: Union[Executor, None] = None,
+                 metrics: Union[RunMetrics, None] = None,
+                 payload_store: Union[PayloadStore, None] = None,
+                 keep_alive: bool = False,
+                 plan_dir: Union[str, Path, None] = None,
+                 shards: int = 1,
+                 split: bool = False):
+        self._path_postman_collection = path_postman_collection
+        self._path_postman_environment = path_postman_environment
+        self._client_settings = {'limit': limit, 'limit_per_host': limit_per_host, 'dns_cache_ttl': dns_cache_ttl,
+                                 'cache': cache, 'rate_limiter': rate_limiter, 'retry_policy': retry_policy,
+                                 'connect_timeout': connect_timeout, 'read_timeout': read_timeout,
+                                 'max_body_size': max_body_size}
+        # seconds from the start of the run, the endpoints still waiting for a response then use a fallback
+        self._deadline = deadline
+        self._stream = stream
+        self._options = GenerationOptions() if options is None else options
+        self._jobs = OpenAPIDoc.resolve_jobs(jobs)
+        # inference runs out of the event loop, that meanwhile keeps sending the requests
+        self._executor = executor
+        self._payload_store = payload_store
+        # directory of the compiled plans of the collections
+        self._plan_dir = plan_dir
+        # where a streamed collection is compiled when there is no plan_dir, removed by close
+        self._temporary_plan_dir = None
+        # processes fetching the collection, each one a contiguous part of it
+        self._shards = shards
+        # paths and schemas written to files of their own next to the openapi doc
+        self._split = split
+        # a long running process keeps, from one run to the next, the connection pool, the worker processes and
+        # the fragments of the endpoints, only the items changed since the previous run are fetched and built
+        self._keep_alive = keep_alive
+        self._client = None
+        self._own_executor = executor is None
+        self._state = None
+        self._writer = None
+        # the one thread the writer serializes and writes the paths in, in the order they are handed over, while
+        # the event loop keeps fetching
+        self._writer_thread = None
+        # build and emit are summed over the endpoints, they overlap with the fetch in the pipeline stage
+        self.metrics = RunMetrics() if metrics is None else metrics
+
+    def _plan_directory(self) -> Union[str, Path, None]:
+        if self._plan_dir is not None or not self._stream:
+            return self._plan_dir
+        # a streamed collection can be read only once, it is compiled into a plan that records the paths of the
+        # endpoints while it is parsed, and is then fetched from the plan
+        if self._temporary_plan_dir is None:
+            self._temporary_plan_dir = tempfile.TemporaryDirectory(prefix='openapi_generator_plan_')
+        return self._temporary_plan_dir.name
+
+    @staticmethod
+    def _endpoint_paths(tags_endpoints, planned: bool):
+        if planned:
+            # recorded in the plan when it was compiled
+            return tags_endpoints.paths()
+        return [PostmanAPIDoc.endpoint_path(endpoint) for _, endpoint in tags_endpoints]
+
+    async def _emit(self, function, *args):
+        _, seconds = await asyncio.get_event_loop().run_in_executor(self._writer_thread, timed_call, function, *args)
+        self.metrics.add_time('emit', seconds)
+
+    async def _add(self, index: int, method: Union[str, None], fingerprint: Union[str, None], fragment):
+        await self._emit(self._writer.add, index, method, fingerprint, fragment)
+
+    async def _consume(self, index: int, endpoint: Union[Endpoint, None]):
+        if endpoint is None:
+            await self._add(index, None, None, None)
+            return
+        endpoint = OpenAPIDoc.OpenAPIEndpoint.from_endpoint(endpoint)
+        if endpoint.prebuilt:
+            fragment, seconds = endpoint.prebuilt, 0.0
+        else:
+            fragment, seconds = await asyncio.get_event_loop().run_in_executor(
+                self._executor, timed_call, OpenAPIDoc._build_operation_and_endpoint_schemas, endpoint, self._options)
+        endpoint_metrics = self.metrics.endpoint(index)
+        endpoint_metrics.build_seconds = seconds
+        endpoint_metrics.components = len(fragment[1])
+        self.metrics.add_time('build', seconds)
+        await self._add(index, endpoint.method, endpoint.fingerprint, fragment)
+
+    def _prepare_client(self, deadline: Union[float, None]) -> HTTPClient:
+        if self._client is None or not self._keep_alive:
+            self._client = HTTPClient(deadline=deadline, **self._client_settings)
+            if self._keep_alive:
+                # opened out of the run, so that its session is not closed at the end of it
+                asyncio.get_event_loop().run_until_complete(self._client.open())
+        self._client.deadline = deadline
+        return self._client
+
+    def _prepare_executor(self):
+        if self._executor is None and self._jobs > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self._jobs)
+        elif self._executor is None:
+            # a single worker, more threads would only contend for the GIL
+            self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def close(self):
+        # releases what keep_alive kept between the runs
+        if self._client is not None:
+            asyncio.get_event_loop().run_until_complete(self._client.close())
+            self._client = None
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._temporary_plan_dir is not None:
+            self._temporary_plan_dir.cleanup()
+            self._temporary_plan_dir = None
+        self._state = None
+
+    def run(self,
+            output_path: Path,
+            output_format: str = FORMAT_YAML,
+            incremental: bool = False,
+            only_if_changed: bool = False) -> bool:
+        # returns whether the output has been written, with only_if_changed an output with the same content is
+        # left untouched
+        deadline = None if self._deadline is None else time.monotonic() + self._deadline
+        client = self._prepare_client(deadline)
+        try:
+            return asyncio.get_event_loop().run_until_complete(self.generate(output_path, output_format, incremental,
+                                                                             only_if_changed, client))
+        finally:
+            if not self._keep_alive:
+                self.close()
+
+    async def generate(self,
+                       output_path: Path,
+                       output_format: str,
+                       incremental: bool,
+                       only_if_changed: bool,
+                       client: HTTPClient) -> bool:
+        # the run on a loop already running, many pipelines can share the client and the executor
+        previous_state = self._state
+        if previous_state is None and incremental:
+            previous_state = IncrementalState.load(output_path, self._options.key())
+        elif previous_state is None and self._keep_alive:
+            previous_state = IncrementalState(settings=self._options.key())
+        state = IncrementalState(settings=self._options.key()) if previous_state is not None else None
+        plan_dir = self._plan_directory()
+        with self.metrics.stage('read_collection'):
+            name, variables, auth, tags_endpoints = PostmanAPIDoc.read_collection(self._path_postman_collection,
+                                                                                  self._path_postman_environment,
+                                                                                  self._stream, self._options,
+                                                                                  client.deadline is not None,
+                                                                                  plan_dir)
+            endpoint_paths = self._endpoint_paths(tags_endpoints, plan_dir is not None)
+        self._prepare_executor()
+        # the document is written aside and moved in place when complete, so a failed or interrupted run never
+        # leaves a truncated output and readers never see a partial one
+        target_path = f'{output_path}.tmp'
+        try:
+            with open(target_path, 'w', encoding='utf-8') as f:
+                self._writer = DocumentWriter(create_emitter(output_format, f, output_path if self._split else None),
+                                              endpoint_paths, state)
+                self._writer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='openapi_generator_writer')
+                try:
+                    await self._emit(self._writer.start, OpenAPIDoc.document_header(name))
+                    with self.metrics.stage('pipeline'):
+                        if self._shards > 1:
+                            await PostmanAPIDoc._extract_endpoints_sharded(tags_endpoints, variables, auth, client,
+                                                                           self._shards, previous_state,
+                                                                           self._options, self._consume, self.metrics,
+                                                                           self._payload_store)
+                        else:
+                            await PostmanAPIDoc._extract_endpoints(tags_endpoints, variables, auth, client,
+                                                                   previous_state, self._options, self._consume,
+                                                                   self.metrics, self._payload_store)
+                    await self._emit(self._writer.end)
+                finally:
+                    # a failed run drops the writes still queued and waits for the current one, before the file is
+                    # closed under it
+                    self._writer_thread.shutdown(cancel_futures=True)
+                    self._writer_thread = None
+        except BaseException:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            raise
+        finally:
+            self._writer = None
+        written = True
+        if only_if_changed:
+            written = not os.path.exists(output_path) or not filecmp.cmp(target_path, output_path, shallow=False)
+        if written:
+            os.replace(target_path, output_path)
+        else:
+            os.remove(target_path)
+        if incremental:
+            state.save(output_path)
+        if self._keep_alive:
+            self._state = state
+        return written
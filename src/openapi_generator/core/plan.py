@@ -0,0 +1,195 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# A collection item with what every run derives from the item alone: the parsed request body and the openapi path.
+# Url and headers depend on the variables and the auth, they are resolved by every run
+class PlannedItem(dict):
+    __slots__ = ('body', 'path')
+
+    def __init__(self, item: Dict[str, Any], body: Any, path: str):
+        super().__init__(item)
+        self.body = body
+        self.path = path
+
+
+def _dumps(value: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            # e.g. integers bigger than 64 bits
+            pass
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def _loads(data: memoryview) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(bytes(data))
+
+
+def _record(tags_endpoint: Tuple[Tuple, Dict[str, Any]]) -> Any:
+    tags, item = tags_endpoint
+    if isinstance(item, PlannedItem):
+        return [list(tags), item, item.body, item.path]
+    return [list(tags), item]
+
+
+class _PlanItems:
+    # (tags, item) of the plan, decoded one at a time from the mapped file every time they are iterated
+    def __init__(self, buffer: mmap.mmap, offsets_position: int, count: int):
+        self._buffer = buffer
+        self._offsets_position = offsets_position
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _start(self, index: int) -> int:
+        start, = RequestPlan._INT.unpack_from(self._buffer, self._offsets_position + index * RequestPlan._INT.size)
+        return start
+
+    def paths(self) -> List[Union[str, None]]:
+        # the openapi paths of the items, recorded while the plan was compiled, without decoding the items
+        with memoryview(self._buffer) as view:
+            return RequestPlan._read_record(view, self._start(self._count))
+
+    def __iter__(self) -> Iterator[Tuple[Tuple, Dict[str, Any]]]:
+        view = memoryview(self._buffer)
+        try:
+            for index in range(self._count):
+                record = RequestPlan._read_record(view, self._start(index))
+                if len(record) == 4:
+                    yield tuple(record[0]), PlannedItem(record[1], record[2], record[3])
+                else:
+                    yield tuple(record[0]), record[1]
+        finally:
+            view.release()
+
+
+# The compiled form of a collection, so that the next runs neither parse its JSON nor the request bodies again.
+# The file is
+#   magic | key | header record | item records | paths record | offsets | offsets position
+# with the key the hash of the contents it has been compiled from, every record a length followed by that many
+# bytes of JSON, the header {"name": ...}, an item [tags, item, body, path], or [tags, item] for an item that
+# could not be planned, the paths the openapi path of every item, null for those not planned, and the offsets where
+# every item record and the paths record start. All the integers are unsigned 64 bit little endian. Neither the
+# variables nor the auth are stored, the plan holds nothing that is not in the collection. It is read through mmap
+# and the items are decoded only while iterated
+class RequestPlan:
+    _MAGIC = b'OGPLAN3\n'
+    _KEY_SIZE = 64
+    _INT = struct.Struct('<Q')
+
+    def __init__(self,
+                 name: str,
+                 items: Iterable[Tuple[Tuple, Dict[str, Any]]]):
+        self.name = name
+        self.items = items
+
+    @staticmethod
+    def content_key(path_postman_collection: Path,
+                    path_postman_environment: Union[Path, None],
+                    settings: str = '') -> str:
+        digest = hashlib.sha256(RequestPlan._MAGIC + settings.encode())
+        for path in (path_postman_collection, path_postman_environment):
+            digest.update(b'\0')
+            if path is None:
+                continue
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def plan_path(directory: Union[str, Path],
+                  path_postman_collection: Path,
+                  path_postman_environment: Union[Path, None]) -> Path:
+        # one plan for every pair of files, replaced when their content changes
+        paths = f'{Path(path_postman_collection).resolve()}\0' \
+                f'{"" if path_postman_environment is None else Path(path_postman_environment).resolve()}'
+        return Path(directory) / f'{hashlib.sha256(paths.encode()).hexdigest()[:32]}.plan'
+
+    @staticmethod
+    def _write_record(f, value: Any):
+        data = _dumps(value)
+        f.write(RequestPlan._INT.pack(len(data)))
+        f.write(data)
+
+    @staticmethod
+    def _read_record(view: memoryview, start: int) -> Any:
+        size, = RequestPlan._INT.unpack_from(view, start)
+        start += RequestPlan._INT.size
+        if start + size > len(view):
+            raise ValueError('truncated record')
+        return _loads(view[start:start + size])
+
+    def save(self, path: Union[str, Path], key: str):
+        # the items are written as they are iterated, a streamed collection is never fully in memory
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(RequestPlan._MAGIC + key.encode())
+                RequestPlan._write_record(f, {'name': self.name})
+                offsets = []
+                paths = []
+                for tags_endpoint in self.items:
+                    offsets.append(f.tell())
+                    RequestPlan._write_record(f, _record(tags_endpoint))
+                    paths.append(tags_endpoint[1].path if isinstance(tags_endpoint[1], PlannedItem) else None)
+                offsets.append(f.tell())
+                RequestPlan._write_record(f, paths)
+                offsets_position = f.tell()
+                f.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+                f.write(RequestPlan._INT.pack(offsets_position))
+            # a plan is replaced at once, a run reading it meanwhile keeps the previous one
+            os.replace(temp_path, path)
+        except BaseException:
+            if temp_path.exists():
+                temp_path.unlink()
+            raise
+
+    @classmethod
+    def load(cls, path: Union[str, Path], key: str):
+        # the plan, or None if missing, unreadable or compiled from different contents
+        try:
+            with open(path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        start = len(RequestPlan._MAGIC)
+        if buffer[:start] != RequestPlan._MAGIC or buffer[start:start + RequestPlan._KEY_SIZE] != key.encode():
+            buffer.close()
+            return None
+        start += RequestPlan._KEY_SIZE
+        try:
+            with memoryview(buffer) as view:
+                header = RequestPlan._read_record(view, start)
+            offsets_position, = RequestPlan._INT.unpack_from(buffer, len(buffer) - RequestPlan._INT.size)
+            count, remainder = divmod(len(buffer) - RequestPlan._INT.size - offsets_position, RequestPlan._INT.size)
+            # the last offset is the one of the paths record
+            count -= 1
+            if offsets_position < start or remainder or count < 0:
+                raise ValueError('bad offsets')
+            name = header['name']
+        except (struct.error, ValueError, TypeError, KeyError):
+            # a truncated file
+            buffer.close()
+            return None
+        return cls(name, _PlanItems(buffer, offsets_position, count))
@@ -1,16 +1,46 @@
 import asyncio
 import json
+import multiprocessing
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List, Union, Tuple
-
-from aiohttp import ClientSession
+from typing import Dict, Any, List, Union, Tuple, Iterable, Iterator, Callable, Awaitable
 
 from .apidoc import APIDoc, Endpoint
+from .cache import ResponseCache
+from .client import DeadlineExceededError, HTTPClient, StatusResponseError
+from .incremental import IncrementalState
+from .inference import create_schema_builder
+from .jsonstream import JSONStreamReader
+from .metrics import EndpointMetrics, RunMetrics, set_current_endpoint
+from .ratelimit import RateLimiter, RetryPolicy
+from .options import SOURCE_SAVED_EXAMPLES, GenerationOptions
+from .payloads import PayloadStore
+from .plan import PlannedItem, RequestPlan
 from .common import read_json_file
 
 
 class PostmanAPIDoc(APIDoc):
+    # item fields never read by the generator, skipped by the streaming parser
+    _HEAVY_ITEM_FIELDS = ('response', 'event')
+
+    # query params changed to get more pages of the same endpoint as response samples
+    _PAGE_PARAMS = ('page', 'pageNumber', 'page_number', 'pageIndex', 'page_index')
+    _OFFSET_PARAMS = ('offset', 'skip', 'start', 'from')
+    _LIMIT_PARAMS = ('limit', 'size', 'pageSize', 'page_size', 'per_page', 'perPage', 'count', 'take')
+
+    # responses used for the endpoints that missed the deadline, in order of preference
+    FALLBACK_CACHE = 'cache'
+    FALLBACK_SAVED_EXAMPLE = 'saved_example'
+    FALLBACK_PARAMETERS = 'parameters'
+
+    # in the processes fetching the shards, where the endpoints are sent back to the parent as soon as they are built
+    _shard_queue = None
+
     class PostmanEndpoint(Endpoint):
+        __slots__ = ()
+
         def __init__(self,
                      *,
                      name: str,
@@ -20,7 +50,12 @@ class PostmanAPIDoc(APIDoc):
                      request_query_params: Union[Dict[str, Any], None],
                      request_path_params: Union[Dict[str, Any], None],
                      request_body: Union[Dict[str, Any], None],
-                     response_example: Dict[str, Any]):
+                     response_example: Dict[str, Any],
+                     fingerprint: Union[str, None] = None,
+                     prebuilt: Union[Tuple[Dict[str, Any], Dict[str, Any]], None] = None,
+                     response_builder: Any = None,
+                     response_key: Union[str, None] = None,
+                     other_responses: Union[Dict[str, Any], None] = None):
             super().__init__(name=name,
                              path=path,
                              method=method,
@@ -28,7 +63,12 @@ class PostmanAPIDoc(APIDoc):
                              request_query_params=request_query_params,
                              request_path_params=request_path_params,
                              request_body=request_body,
-                             response_example=response_example)
+                             response_example=response_example,
+                             fingerprint=fingerprint,
+                             prebuilt=prebuilt,
+                             response_builder=response_builder,
+                             response_key=response_key,
+                             other_responses=other_responses)
 
     @staticmethod
     def _compose_path(path_elems: List[str]) -> str:
@@ -56,42 +96,216 @@ class PostmanAPIDoc(APIDoc):
         return None if not path_params else path_params
 
     @staticmethod
-    async def _extract_endpoints(tags_endpoints_map: Dict[Tuple, Any],
+    async def _extract_endpoints(tags_endpoints: Iterable[Tuple[Tuple, Dict[str, Any]]],
                                  variables: Dict[str, str],
-                                 auth: Dict[str, Any]) -> List[Endpoint]:
-        coroutines = []
-        for tags in tags_endpoints_map:
-            coroutines.append(PostmanAPIDoc._build_endpoint(tags_endpoints_map, variables, auth, tags))
-        results = await asyncio.gather(*coroutines)
+                                 auth: Dict[str, Any],
+                                 client: HTTPClient,
+                                 previous_state: Union[IncrementalState, None] = None,
+                                 options: Union[GenerationOptions, None] = None,
+                                 consumer: Union[Callable[[int, Union[Endpoint, None]], Awaitable[Any]], None] = None,
+                                 metrics: Union[RunMetrics, None] = None,
+                                 payload_store: Union[PayloadStore, None] = None) -> List[Any]:
+        # items are consumed lazily so that a streamed collection is never fully in memory: no more tasks than
+        # twice the connection limit are waiting at the same time.
+        # With a consumer every endpoint, or None if it failed, is handed over with its index as soon as it is
+        # built and the results are the ones of the consumer, so endpoints are not kept until the end
+        max_pending = client.limit * 2 if client.limit else None
+        async with client:
+            tasks = []
+            pending = set()
+            for index, (tags, endpoint) in enumerate(tags_endpoints):
+                if max_pending and len(pending) >= max_pending:
+                    _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                endpoint_metrics = None if metrics is None else metrics.endpoint(index, endpoint.get('name'))
+                coroutine = PostmanAPIDoc._build_endpoint(endpoint, variables, auth, tags, client, previous_state,
+                                                          options, endpoint_metrics, payload_store)
+                if consumer is not None:
+                    coroutine = PostmanAPIDoc._consume_endpoint(index, coroutine, consumer)
+                task = asyncio.ensure_future(coroutine)
+                tasks.append(task)
+                pending.add(task)
+            results = await asyncio.gather(*tasks)
         return list(results)
 
     @staticmethod
-    async def _build_endpoint(tags_endpoints_map: Dict[Tuple, Any],
+    def _init_shard_worker(shard_queue: multiprocessing.Queue):
+        PostmanAPIDoc._shard_queue = shard_queue
+
+    @staticmethod
+    def _fetch_shard(shard: List[Tuple[int, Tuple, Dict[str, Any]]],
+                     variables: Dict[str, str],
+                     auth: Dict[str, Any],
+                     client_settings: Dict[str, Any],
+                     remaining: Union[float, None],
+                     previous_state: Union[IncrementalState, None],
+                     options: Union[GenerationOptions, None],
+                     spill_threshold: Union[int, None]):
+        # runs in a worker process with its own event loop and connection pool. Every endpoint goes back through
+        # the queue, with its metrics and the index it has in the collection, as soon as it is built, and a None
+        # marks the end of the shard
+        shard_queue = PostmanAPIDoc._shard_queue
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        client = HTTPClient(deadline=None if remaining is None else time.monotonic() + remaining, **client_settings)
+        metrics = RunMetrics()
+        # spilled in memory, so that the large payloads are sent back compressed
+        payload_store = None if spill_threshold is None else PayloadStore(threshold=spill_threshold)
+
+        async def send(local_index: int, endpoint: Union[Endpoint, None]):
+            index = shard[local_index][0]
+            endpoint_metrics = metrics.endpoint(local_index)
+            endpoint_metrics.index = index
+            shard_queue.put((index, endpoint, endpoint_metrics))
+
+        try:
+            loop.run_until_complete(PostmanAPIDoc._extract_endpoints(
+                [(tags, endpoint) for _, tags, endpoint in shard], variables, auth, client, previous_state, options,
+                send, metrics, payload_store))
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+            shard_queue.put(None)
+
+    @staticmethod
+    async def _extract_endpoints_sharded(tags_endpoints: Iterable[Tuple[Tuple, Dict[str, Any]]],
+                                         variables: Dict[str, str],
+                                         auth: Dict[str, Any],
+                                         client: HTTPClient,
+                                         shards: int,
+                                         previous_state: Union[IncrementalState, None] = None,
+                                         options: Union[GenerationOptions, None] = None,
+                                         consumer: Union[Callable[[int, Union[Endpoint, None]], Awaitable[Any]],
+                                                         None] = None,
+                                         metrics: Union[RunMetrics, None] = None,
+                                         payload_store: Union[PayloadStore, None] = None) -> List[Any]:
+        # as _extract_endpoints, but the collection is split in contiguous shards fetched by as many processes,
+        # so that decoding the responses is not bound to one core. Every endpoint is handed to the consumer as soon
+        # as its process has built it, the results are in the order of the collection
+        items = [(index, tags, endpoint) for index, (tags, endpoint) in enumerate(tags_endpoints)]
+        size = max(1, -(-len(items) // shards))
+        settings = client.shard_settings(shards)
+        spill_threshold = None if payload_store is None else payload_store.threshold
+        loop = asyncio.get_event_loop()
+        results = [None] * len(items)
+        shard_queue = multiprocessing.Queue()
+        try:
+            with ProcessPoolExecutor(max_workers=shards, initializer=PostmanAPIDoc._init_shard_worker,
+                                     initargs=(shard_queue,)) as executor:
+                futures = [loop.run_in_executor(executor, PostmanAPIDoc._fetch_shard, items[start:start + size],
+                                                variables, auth, settings, client.remaining(), previous_state,
+                                                options, spill_threshold)
+                           for start in range(0, len(items), size)]
+                running = len(futures)
+                while running:
+                    try:
+                        message = await loop.run_in_executor(None, shard_queue.get, True, 0.5)
+                    except queue.Empty:
+                        if all(future.done() for future in futures):
+                            # a process died before marking the end of its shard, its error is raised below
+                            break
+                        continue
+                    if message is None:
+                        running -= 1
+                        continue
+                    index, endpoint, endpoint_metrics = message
+                    if metrics is not None:
+                        metrics.endpoints[index] = endpoint_metrics
+                    results[index] = endpoint if consumer is None else await consumer(index, endpoint)
+                for future in futures:
+                    await future
+        finally:
+            shard_queue.close()
+        return results
+
+    @staticmethod
+    async def _consume_endpoint(index: int,
+                                coroutine: Awaitable[Union[Endpoint, None]],
+                                consumer: Callable[[int, Union[Endpoint, None]], Awaitable[Any]]) -> Any:
+        return await consumer(index, await coroutine)
+
+    @staticmethod
+    async def _build_endpoint(endpoint: Dict[str, Any],
                               variables: Dict[str, str],
                               auth: Dict[str, Any],
-                              tags: Tuple) -> PostmanEndpoint:
+                              tags: Tuple,
+                              client: HTTPClient,
+                              previous_state: Union[IncrementalState, None] = None,
+                              options: Union[GenerationOptions, None] = None,
+                              endpoint_metrics: Union[EndpointMetrics, None] = None,
+                              payload_store: Union[PayloadStore, None] = None) -> PostmanEndpoint:
+        # every endpoint is built by its own task, the metrics set here are seen only by its requests
+        set_current_endpoint(endpoint_metrics)
         try:
-            endpoint = tags_endpoints_map[tags]
             name = endpoint['name']
             request = endpoint['request']
             method = request['method'].lower()
-            path = PostmanAPIDoc._compose_path(request['url']['path'])
+            path = endpoint.path if isinstance(endpoint, PlannedItem) else PostmanAPIDoc._compose_path(
+                request['url']['path'])
             request_query_params = None if 'query' not in request['url'] else {param['key']: param['value'] for param in
                                                                                request['url']['query']}
             request_path_params = PostmanAPIDoc._extract_path_params(variables)
-            request_body = None if 'body' not in request else json.loads(request['body']['raw'])
+            if isinstance(endpoint, PlannedItem):
+                request_body = endpoint.body
+            else:
+                request_body = None if 'body' not in request else json.loads(request['body']['raw'])
 
             request_body_is_none = False
             if method == 'post' and request_body is None:
                 request_body = ''
                 request_body_is_none = True
 
-            response_example = await PostmanAPIDoc._get_response_example(request, variables, request_body, auth)
+            saved_responses = options is not None and options.uses_saved_examples
+            fingerprint = None
+            prebuilt = None
+            if previous_state is not None:
+                fingerprint = IncrementalState.fingerprint(tags, endpoint, variables, request_path_params, auth,
+                                                           saved_responses)
+                prebuilt = previous_state.lookup(fingerprint)
+
+            if endpoint_metrics is not None:
+                endpoint_metrics.method = method
+                endpoint_metrics.path = path
+            fetch_start = time.perf_counter()
+            response_example = None
+            response_builder = None
+            response_key = None
+            saved_example = None
+            other_responses = None
+            if prebuilt is None and saved_responses:
+                saved_example, other_responses = PostmanAPIDoc._get_saved_examples(endpoint)
+            if saved_example is not None:
+                status, response_example = saved_example
+                if endpoint_metrics is not None:
+                    endpoint_metrics.status = status
+            elif prebuilt is None and (options is None or options.response_source != SOURCE_SAVED_EXAMPLES):
+                # without a successful example saved, saved-examples only leaves the endpoint with its parameters
+                try:
+                    response_example, response_builder = await client.until_deadline(
+                        PostmanAPIDoc._get_response(endpoint, variables, request_body, auth, client, options))
+                    if response_builder is None:
+                        url, headers = PostmanAPIDoc._request_target(endpoint, variables, auth)
+                        response_key = HTTPClient.request_key(request['method'], url, headers, request_body)
+                except DeadlineExceededError:
+                    response_example, fallback = PostmanAPIDoc._get_fallback_example(endpoint, variables,
+                                                                                     request_body, auth, client)
+                    print(f'WARNING: endpoint {name} missed the deadline, response taken from {fallback}')
+                    # not stored for the incremental runs, the next run has to call the service again
+                    fingerprint = None
+                    if endpoint_metrics is not None:
+                        endpoint_metrics.fallback = fallback
+                except StatusResponseError as e:
+                    # e.g. 404 or 401, the body describes that status and not the successful response
+                    print(f'WARNING: endpoint {name} answered {e.status}, documented under that status')
+                    other_responses = dict(other_responses or {})
+                    other_responses.setdefault(str(e.status), e.body)
+
+            if endpoint_metrics is not None:
+                endpoint_metrics.fetch_seconds = time.perf_counter() - fetch_start
 
             if request_body_is_none:
                 request_body = None
 
-            return PostmanAPIDoc.PostmanEndpoint(
+            postman_endpoint = PostmanAPIDoc.PostmanEndpoint(
                 name=name,
                 path=path,
                 method=method,
@@ -99,9 +313,19 @@ class PostmanAPIDoc(APIDoc):
                 request_query_params=request_query_params,
                 request_path_params=request_path_params,
                 request_body=request_body,
-                response_example=response_example
+                response_example=response_example,
+                fingerprint=fingerprint,
+                prebuilt=prebuilt,
+                response_builder=response_builder,
+                response_key=response_key,
+                other_responses=other_responses
             )
+            if payload_store is not None:
+                postman_endpoint.spill(payload_store)
+            return postman_endpoint
         except Exception as e:
+            if endpoint_metrics is not None:
+                endpoint_metrics.failed = True
             print(f'Error with endpoint {endpoint["name"]} ---> {e}')
 
     @staticmethod
@@ -121,36 +345,156 @@ class PostmanAPIDoc(APIDoc):
         return url
 
     @staticmethod
-    async def _get_response_example(request: Dict[str, Any],
-                                    variables: Dict[str, str],
-                                    request_body: Dict[str, str],
-                                    auth: Dict[str, Any]) -> Dict[str, Any]:
-        url = PostmanAPIDoc._build_url(request['url'], variables)
-
+    def _build_headers(request: Dict[str, Any],
+                       variables: Dict[str, str],
+                       auth: Dict[str, Any]) -> Dict[str, str]:
         headers = {}
         if auth['position'] == 'header':
             headers.update(auth['params'])
         if 'header' in request:
             req_headers = PostmanAPIDoc._extract_headers(request['header'], variables)
             headers.update(req_headers)
+        return headers
+
+    @staticmethod
+    def _request_target(endpoint: Dict[str, Any],
+                        variables: Dict[str, str],
+                        auth: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+        # url and headers of the request of a collection item, resolved by every run also from a compiled plan,
+        # that keeps neither the variables nor the auth
+        request = endpoint['request']
+        return PostmanAPIDoc._build_url(request['url'], variables), PostmanAPIDoc._build_headers(request, variables,
+                                                                                                  auth)
+
+    @staticmethod
+    async def _get_response_example(request: Dict[str, Any],
+                                    variables: Dict[str, str],
+                                    request_body: Dict[str, str],
+                                    auth: Dict[str, Any],
+                                    client: HTTPClient) -> Dict[str, Any]:
+        url = PostmanAPIDoc._build_url(request['url'], variables)
+        headers = PostmanAPIDoc._build_headers(request, variables, auth)
+        return await client.request(request['method'], url, headers, request_body)
+
+    @staticmethod
+    async def _get_response(endpoint: Dict[str, Any],
+                            variables: Dict[str, str],
+                            request_body: Dict[str, str],
+                            auth: Dict[str, Any],
+                            client: HTTPClient,
+                            options: Union[GenerationOptions, None] = None) -> Tuple[Any, Any]:
+        # the response example and, with many samples, the schema builder they have been merged in
+        if options is not None and options.samples > 1:
+            return await PostmanAPIDoc._get_response_samples(endpoint, variables, request_body, auth, client,
+                                                             options)
+        url, headers = PostmanAPIDoc._request_target(endpoint, variables, auth)
+        return await client.request(endpoint['request']['method'], url, headers, request_body), None
+
+    @staticmethod
+    def _get_fallback_example(endpoint: Dict[str, Any],
+                              variables: Dict[str, str],
+                              request_body: Dict[str, str],
+                              auth: Dict[str, Any],
+                              client: HTTPClient) -> Tuple[Any, str]:
+        # the cached response even if expired, else the first successful example saved in the collection,
+        # else no response at all and the endpoint has only its parameters
+        url, headers = PostmanAPIDoc._request_target(endpoint, variables, auth)
+        cached = client.cached(endpoint['request']['method'], url, headers, request_body)
+        if cached is not None:
+            return cached, PostmanAPIDoc.FALLBACK_CACHE
+        for code, body in PostmanAPIDoc._extract_saved_responses(endpoint):
+            if 200 <= code < 300:
+                return body, PostmanAPIDoc.FALLBACK_SAVED_EXAMPLE
+        return None, PostmanAPIDoc.FALLBACK_PARAMETERS
+
+    @staticmethod
+    def _get_saved_examples(endpoint: Dict[str, Any]) -> Tuple[Union[Tuple[int, Any], None], Dict[str, Any]]:
+        # status and body of the first successful example saved in the collection, if any, and the first example
+        # of every error status
+        successful = None
+        other_responses = {}
+        for code, body in PostmanAPIDoc._extract_saved_responses(endpoint):
+            if 200 <= code < 300:
+                if successful is None:
+                    successful = code, body
+            else:
+                other_responses.setdefault(str(code), body)
+        return successful, other_responses
+
+    @staticmethod
+    def _extract_saved_responses(endpoint: Dict[str, Any]) -> List[Tuple[int, Any]]:
+        # the examples saved in postman with a JSON body
+        saved_responses = []
+        for response in endpoint.get('response', []):
+            try:
+                body = json.loads(response['body'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            saved_responses.append((response.get('code', 200), body))
+        return saved_responses
+
+    @staticmethod
+    def _paginated_requests(request: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+        # copies of the request asking for the following pages, if the request has a known pagination param
+        query = request['url'].get('query', [])
+        params = {param['key']: param for param in query}
+        limit = next((params[name]['value'] for name in PostmanAPIDoc._LIMIT_PARAMS if name in params), None)
+        step_param = next((name for name in PostmanAPIDoc._PAGE_PARAMS if name in params), None)
+        step = 1
+        if step_param is None and limit is not None and limit.isdigit():
+            step_param = next((name for name in PostmanAPIDoc._OFFSET_PARAMS if name in params), None)
+            step = int(limit)
+        if step_param is None or not params[step_param]['value'].isdigit():
+            return []
 
-        async with ClientSession() as session:
-            if request['method'] == 'POST':
-                http_call = session.post
-            elif request['method'] == 'GET':
-                http_call = session.get
-            elif request['method'] == 'PUT':
-                http_call = session.put
-            elif request['method'] == 'DELETE':
-                http_call = session.delete
-
-            async with http_call(
-                    url=url,
-                    json=request_body,
-                    headers=headers
-            ) as response:
-                resp = await response.json()
-        return resp
+        requests = []
+        start = int(params[step_param]['value'])
+        for page in range(1, count + 1):
+            page_query = [dict(param, value=str(start + page * step)) if param['key'] == step_param else param
+                          for param in query]
+            requests.append(dict(request, url=dict(request['url'], query=page_query)))
+        return requests
+
+    @staticmethod
+    async def _get_response_samples(endpoint: Dict[str, Any],
+                                    variables: Dict[str, str],
+                                    request_body: Dict[str, str],
+                                    auth: Dict[str, Any],
+                                    client: HTTPClient,
+                                    options: GenerationOptions) -> Tuple[Any, Any]:
+        # up to options.samples responses are merged in one schema builder: the live response, the saved
+        # examples and, only for GET, the following pages. Samples are added in order as soon as they are
+        # available and then released, the live response is kept as example
+        request = endpoint['request']
+        saved_samples = [body for code, body in PostmanAPIDoc._extract_saved_responses(endpoint)
+                         if 200 <= code < 300][:options.samples - 1]
+        requests = [request]
+        if request['method'] == 'GET':
+            requests.extend(PostmanAPIDoc._paginated_requests(request, options.samples - 1 - len(saved_samples)))
+        tasks = [asyncio.ensure_future(PostmanAPIDoc._get_response_example(sample_request, variables, request_body,
+                                                                           auth, client))
+                 for sample_request in requests]
+        builder = create_schema_builder(options.schema_engine)
+        merged = 0
+        try:
+            response_example = await tasks[0]
+            for index, task in enumerate(tasks):
+                try:
+                    sample = await task
+                except Exception as e:
+                    print(f'WARNING: sample {index} of endpoint {endpoint["name"]} skipped ---> {e}')
+                    continue
+                if sample:
+                    builder.add_object(options.sampling.sample(sample))
+                    merged += 1
+            for sample in saved_samples:
+                if sample:
+                    builder.add_object(options.sampling.sample(sample))
+                    merged += 1
+        finally:
+            for task in tasks:
+                task.cancel()
+        return response_example, builder if merged else None
 
     @staticmethod
     def _extract_headers(headers: List[Dict[str, str]],
@@ -187,29 +531,184 @@ class PostmanAPIDoc(APIDoc):
         return auth
 
     @staticmethod
-    def _extract_tags_endpoint(tags_endpoints_map: Dict[Tuple, Any],
+    def _extract_tags_endpoint(tags_endpoints: List[Tuple[Tuple, Dict[str, Any]]],
                                collection: Dict[str, Any], tags: List[str] = []):
+        # every item is kept, also those with the same name and method in the same folder, in the order of the
+        # collection, as the streamed parser yields them
         for item in collection['item']:
             tags_new = []
             tags_new.extend(tags)
             tags_new.append(item['name'])
             if 'request' in item:
                 tags_new.append(item['request']['method'])
-                tags_endpoints_map[tuple(tags_new)] = item
+                tags_endpoints.append((tuple(tags_new), item))
             else:
-                PostmanAPIDoc._extract_tags_endpoint(tags_endpoints_map, item, tags_new)
+                PostmanAPIDoc._extract_tags_endpoint(tags_endpoints, item, tags_new)
 
-    @classmethod
-    def factory(cls,
-                path_postman_collection: Path,
-                path_postman_environment: Path):
+    @staticmethod
+    def _read_collection_header(path_postman_collection: Path) -> Dict[str, Any]:
+        # everything but the items, that in exported collections come before the auth
+        header = {}
+        with open(path_postman_collection) as f:
+            reader = JSONStreamReader(f)
+            for key in reader.iter_object():
+                if key == 'item':
+                    reader.skip_value()
+                else:
+                    header[key] = reader.read_value()
+        return header
+
+    @staticmethod
+    def _iter_tags_endpoint_stream(path_postman_collection: Path,
+                                   keep_responses: bool = False) -> Iterator[Tuple[Tuple, Dict[str, Any]]]:
+        with open(path_postman_collection) as f:
+            reader = JSONStreamReader(f)
+            for key in reader.iter_object():
+                if key == 'item':
+                    yield from PostmanAPIDoc._iter_items_stream(reader, [], keep_responses)
+                else:
+                    reader.skip_value()
+
+    @staticmethod
+    def _iter_items_stream(reader: JSONStreamReader,
+                           tags: List[str],
+                           keep_responses: bool = False) -> Iterator[Tuple[Tuple, Dict[str, Any]]]:
+        item_fields = ('name', 'request', 'response') if keep_responses else ('name', 'request')
+        skip_fields = tuple(field for field in PostmanAPIDoc._HEAVY_ITEM_FIELDS if field not in item_fields)
+        for _ in reader.iter_array():
+            item = {}
+            for key in reader.iter_object():
+                if key == 'item' and 'name' in item:
+                    yield from PostmanAPIDoc._iter_items_stream(reader, tags + [item['name']], keep_responses)
+                elif key == 'item':
+                    # the folder name comes after its items, this subtree has to be read before walking it
+                    item['item'] = reader.read_filtered_value(skip_fields)
+                elif key in item_fields:
+                    item[key] = reader.read_value()
+                else:
+                    reader.skip_value()
+            if 'request' in item:
+                yield tuple(tags + [item['name'], item['request']['method']]), item
+            elif 'item' in item:
+                tags_endpoints = []
+                PostmanAPIDoc._extract_tags_endpoint(tags_endpoints, item, tags + [item['name']])
+                yield from tags_endpoints
+
+    @staticmethod
+    def endpoint_path(endpoint: Dict[str, Any]) -> Union[str, None]:
+        # the openapi path of a collection item, known before its request is sent
+        if isinstance(endpoint, PlannedItem):
+            return endpoint.path
+        try:
+            return PostmanAPIDoc._compose_path(endpoint['request']['url']['path'])
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    @staticmethod
+    def _compile_items(tags_endpoints: Iterable[Tuple[Tuple, Dict[str, Any]]],
+                       keep_responses: bool = False) -> Iterator[Tuple[Tuple, Dict[str, Any]]]:
+        item_fields = ('name', 'request', 'response') if keep_responses else ('name', 'request')
+        for tags, endpoint in tags_endpoints:
+            item = {field: endpoint[field] for field in item_fields if field in endpoint}
+            try:
+                request = item['request']
+                body = None if 'body' not in request else json.loads(request['body']['raw'])
+                item = PlannedItem(item, body, PostmanAPIDoc._compose_path(request['url']['path']))
+            except Exception:
+                # planned as it is, the run reports its error
+                pass
+            yield tags, item
+
+    @staticmethod
+    def _read_collection_source(path_postman_collection: Path,
+                                path_postman_environment: Path,
+                                stream: bool,
+                                keep_responses: bool) \
+            -> Tuple[str, Dict[str, str], Dict[str, Any], Iterable[Tuple[Tuple, Dict[str, Any]]]]:
         environment = read_json_file(path_postman_environment)
         variables = PostmanAPIDoc._extract_env_variables(environment)
-        collection = read_json_file(path_postman_collection)
-        tags_endpoints_map = {}
-        PostmanAPIDoc._extract_tags_endpoint(tags_endpoints_map, collection)
+        if stream:
+            collection = PostmanAPIDoc._read_collection_header(path_postman_collection)
+            tags_endpoints = PostmanAPIDoc._iter_tags_endpoint_stream(path_postman_collection, keep_responses)
+        else:
+            collection = read_json_file(path_postman_collection)
+            tags_endpoints = []
+            PostmanAPIDoc._extract_tags_endpoint(tags_endpoints, collection)
         auth = PostmanAPIDoc._extract_auth(collection['auth'], variables)
-        # asyncio.run(PostmanAPIDoc._extract_endpoints(endpoints, tags_endpoints_map, variables, auth))
+        return collection['info']['name'], variables, auth, tags_endpoints
+
+    @staticmethod
+    def read_collection(path_postman_collection: Path,
+                        path_postman_environment: Path,
+                        stream: bool = False,
+                        options: Union[GenerationOptions, None] = None,
+                        keep_responses: bool = False,
+                        plan_dir: Union[str, Path, None] = None) \
+            -> Tuple[str, Dict[str, str], Dict[str, Any], Iterable[Tuple[Tuple, Dict[str, Any]]]]:
+        # name, variables, auth and (tags, item) of every endpoint of the collection. With plan_dir name and items
+        # come from the plan compiled by a previous run from the same collection and environment, compiled now if
+        # there is none, while variables and auth are read again from the environment and the collection header
+        keep_responses = keep_responses or options is not None and (options.samples > 1 or
+                                                                     options.uses_saved_examples)
+        if plan_dir is None:
+            return PostmanAPIDoc._read_collection_source(path_postman_collection, path_postman_environment, stream,
+                                                         keep_responses)
+        plan_path = RequestPlan.plan_path(plan_dir, path_postman_collection, path_postman_environment)
+        key = RequestPlan.content_key(path_postman_collection, path_postman_environment,
+                                      f'responses={keep_responses}')
+        plan = RequestPlan.load(plan_path, key)
+        if plan is None:
+            name, variables, auth, tags_endpoints = PostmanAPIDoc._read_collection_source(
+                path_postman_collection, path_postman_environment, stream, keep_responses)
+            RequestPlan(name, PostmanAPIDoc._compile_items(tags_endpoints, keep_responses)).save(plan_path, key)
+            plan = RequestPlan.load(plan_path, key)
+        else:
+            variables = PostmanAPIDoc._extract_env_variables(read_json_file(path_postman_environment))
+            collection = PostmanAPIDoc._read_collection_header(path_postman_collection)
+            auth = PostmanAPIDoc._extract_auth(collection['auth'], variables)
+        return plan.name, variables, auth, plan.items
+
+    @classmethod
+    def factory(cls,
+                path_postman_collection: Path,
+                path_postman_environment: Path,
+                *,
+                limit: int = HTTPClient.DEFAULT_LIMIT,
+                limit_per_host: int = HTTPClient.DEFAULT_LIMIT_PER_HOST,
+                dns_cache_ttl: Union[int, None] = HTTPClient.DEFAULT_DNS_CACHE_TTL,
+                cache: Union[ResponseCache, None] = None,
+                rate_limiter: Union[RateLimiter, None] = None,
+                retry_policy: Union[RetryPolicy, None] = None,
+                connect_timeout: Union[float, None] = HTTPClient.DEFAULT_CONNECT_TIMEOUT,
+                read_timeout: Union[float, None] = HTTPClient.DEFAULT_READ_TIMEOUT,
+                max_body_size: Union[int, None] = HTTPClient.DEFAULT_MAX_BODY_SIZE,
+                deadline: Union[float, None] = None,
+                previous_state: Union[IncrementalState, None] = None,
+                stream: bool = False,
+                options: Union[GenerationOptions, None] = None,
+                metrics: Union[RunMetrics, None] = None,
+                payload_store: Union[PayloadStore, None] = None,
+                plan_dir: Union[str, Path, None] = None,
+                shards: int = 1):
+        # deadline is in seconds from now, the endpoints still waiting for a response then use a fallback
+        deadline = None if deadline is None else time.monotonic() + deadline
+        metrics = RunMetrics() if metrics is None else metrics
+        with metrics.stage('read_collection'):
+            name, variables, auth, tags_endpoints = PostmanAPIDoc.read_collection(path_postman_collection,
+                                                                                  path_postman_environment,
+                                                                                  stream, options,
+                                                                                  deadline is not None, plan_dir)
+        client = HTTPClient(limit=limit, limit_per_host=limit_per_host, dns_cache_ttl=dns_cache_ttl, cache=cache,
+                            rate_limiter=rate_limiter, retry_policy=retry_policy, connect_timeout=connect_timeout,
+                            read_timeout=read_timeout, max_body_size=max_body_size, deadline=deadline)
         loop = asyncio.get_event_loop()
-        endpoints = loop.run_until_complete(PostmanAPIDoc._extract_endpoints(tags_endpoints_map, variables, auth))
-        return cls(collection['info']['name'], [endpoint for endpoint in endpoints if endpoint])
+        with metrics.stage('fetch'):
+            if shards > 1:
+                extract = PostmanAPIDoc._extract_endpoints_sharded(tags_endpoints, variables, auth, client, shards,
+                                                                   previous_state, options, metrics=metrics,
+                                                                   payload_store=payload_store)
+            else:
+                extract = PostmanAPIDoc._extract_endpoints(tags_endpoints, variables, auth, client, previous_state,
+                                                           options, metrics=metrics, payload_store=payload_store)
+            endpoints = loop.run_until_complete(extract)
+        return cls(name, [endpoint for endpoint in endpoints if endpoint])
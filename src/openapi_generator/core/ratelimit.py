@@ -0,0 +1,159 @@
+import asyncio
+import random
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Union
+
+
+def parse_retry_after(value: Union[str, None]) -> Union[float, None]:
+    # seconds to wait, the header holds either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+# Requests per second to a single host. Without a target rate the bucket lets everything through until the
+# host answers 429: the rate then starts from half of the one observed and, as for a target rate, it is halved
+# on 429, at most once a second as the requests already sent answer 429 too, and grows again a little on every
+# success (AIMD). Retry-After pauses the host altogether
+class TokenBucket:
+    MIN_RATE = 0.5
+    RECOVERY = 0.02
+    _WINDOW = 1.0
+
+    def __init__(self, rate: Union[float, None] = None, burst: Union[int, None] = None):
+        self.target = rate
+        self.rate = rate
+        self._burst = burst
+        self._tokens = self.capacity
+        self._updated = None
+        self._paused_until = 0.0
+        self._decreased = None
+        self._recent = deque()
+        self._lock = None
+
+    @property
+    def capacity(self) -> float:
+        if self._burst is not None:
+            return float(self._burst)
+        return max(1.0, self.rate) if self.rate is not None else 1.0
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _observed_rate(self, now: float) -> float:
+        while self._recent and self._recent[0] < now - TokenBucket._WINDOW:
+            self._recent.popleft()
+        return len(self._recent) / TokenBucket._WINDOW
+
+    async def acquire(self):
+        loop = asyncio.get_event_loop()
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # the lock keeps the waiting requests in order
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if self.rate is None:
+                    self._recent.append(now)
+                    return
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def throttled(self, retry_after: Union[float, None] = None):
+        now = asyncio.get_event_loop().time()
+        if self.rate is None:
+            self.rate = max(TokenBucket.MIN_RATE, self._observed_rate(now) / 2)
+            self._recent.clear()
+            self._tokens = 0.0
+            self._updated = now
+            self._decreased = now
+        elif self._decreased is None or now - self._decreased >= TokenBucket._WINDOW:
+            self._refill(now)
+            self.rate = max(TokenBucket.MIN_RATE, self.rate / 2)
+            self._tokens = min(self._tokens, self.capacity)
+            self._decreased = now
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+    def succeeded(self):
+        if self.rate is None:
+            return
+        rate = self.rate * (1 + TokenBucket.RECOVERY)
+        self.rate = rate if self.target is None else min(self.target, rate)
+
+
+class RateLimiter:
+    def __init__(self, rate: Union[float, None] = None, burst: Union[int, None] = None):
+        # target requests per second for every host, None to find it from the 429 responses
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+
+# Exponential backoff with full jitter. The budget bounds the retries of failed requests in the whole run to a
+# fraction of the requests, so that a failing host does not multiply the load, with a minimum for the small
+# collections. Throttled requests are not counted, the rate limiter already slows them down
+class RetryPolicy:
+    DEFAULT_RETRIES = 3
+    DEFAULT_BACKOFF = 0.5
+    DEFAULT_MAX_BACKOFF = 30.0
+    DEFAULT_BUDGET = 0.2
+    MIN_BUDGET = 10
+
+    def __init__(self,
+                 *,
+                 retries: int = DEFAULT_RETRIES,
+                 backoff: float = DEFAULT_BACKOFF,
+                 max_backoff: float = DEFAULT_MAX_BACKOFF,
+                 budget: float = DEFAULT_BUDGET,
+                 seed: Union[int, None] = None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+        self._requests = 0
+        self._retried = 0
+        self._random = random.Random(seed)
+
+    def record_request(self):
+        self._requests += 1
+
+    def allow_retry(self, attempt: int, throttled: bool = False) -> bool:
+        if attempt >= self.retries:
+            return False
+        if throttled:
+            return True
+        if self._retried >= RetryPolicy.MIN_BUDGET + self.budget * self._requests:
+            return False
+        self._retried += 1
+        return True
+
+    def delay(self, attempt: int, retry_after: Union[float, None] = None) -> float:
+        delay = self._random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        return delay if retry_after is None else max(delay, retry_after)
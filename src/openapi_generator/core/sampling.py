@@ -0,0 +1,100 @@
+import random
+from typing import Any, Dict, List, Union
+
+STRATEGY_HEAD = 'head'
+STRATEGY_RESERVOIR = 'reservoir'
+STRATEGY_STRATIFIED = 'stratified'
+STRATEGIES = (STRATEGY_HEAD, STRATEGY_RESERVOIR, STRATEGY_STRATIFIED)
+
+
+# Stands for a container cut by max_depth: its content is unknown, so the schema builders describe it with an open
+# schema instead of the closed one an empty container would give
+class Truncated:
+    __slots__ = ('kind',)
+
+    def __init__(self, kind: str):
+        self.kind = kind
+
+    def __repr__(self) -> str:
+        return f'Truncated({self.kind!r})'
+
+
+TRUNCATED_OBJECT = Truncated('object')
+TRUNCATED_ARRAY = Truncated('array')
+
+
+# Reduces an example before the schema inference: arrays keep at most max_items items, chosen with the
+# strategy, and containers deeper than max_depth are replaced by the Truncated markers
+class SamplingPolicy:
+    def __init__(self,
+                 *,
+                 max_items: Union[int, None] = None,
+                 max_depth: Union[int, None] = None,
+                 strategy: str = STRATEGY_HEAD,
+                 seed: int = 0):
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown sampling strategy {strategy}, choose one of {", ".join(STRATEGIES)}')
+        self.max_items = max_items
+        self.max_depth = max_depth
+        self.strategy = strategy
+        self.seed = seed
+
+    def key(self) -> Dict[str, Any]:
+        return {
+            'max_items': self.max_items,
+            'max_depth': self.max_depth,
+            'strategy': self.strategy,
+            'seed': self.seed
+        }
+
+    def sample(self, example: Any) -> Any:
+        if self.max_items is None and self.max_depth is None:
+            return example
+        # the same seed for every example, so that a run can be reproduced
+        return self._sample(example, 0, random.Random(self.seed))
+
+    def _sample(self, item: Any, depth: int, rng: random.Random) -> Any:
+        if isinstance(item, dict):
+            if self.max_depth is not None and depth >= self.max_depth:
+                return TRUNCATED_OBJECT
+            return {key: self._sample(value, depth + 1, rng) for key, value in item.items()}
+        if isinstance(item, list):
+            if self.max_depth is not None and depth >= self.max_depth:
+                return TRUNCATED_ARRAY
+            return [self._sample(value, depth + 1, rng) for value in self._sample_items(item, rng)]
+        return item
+
+    def _sample_items(self, items: List[Any], rng: random.Random) -> List[Any]:
+        if self.max_items is None or len(items) <= self.max_items:
+            return items
+        if self.strategy == STRATEGY_HEAD:
+            return items[:self.max_items]
+        if self.strategy == STRATEGY_RESERVOIR:
+            indexes = list(range(self.max_items))
+            for index in range(self.max_items, len(items)):
+                position = rng.randint(0, index)
+                if position < self.max_items:
+                    indexes[position] = index
+            return [items[index] for index in sorted(indexes)]
+        return [items[index] for index in SamplingPolicy._stratified_indexes(items, self.max_items)]
+
+    @staticmethod
+    def _signature(item: Any) -> Any:
+        if isinstance(item, dict):
+            return 'object', tuple(sorted(item))
+        return type(item).__name__
+
+    @staticmethod
+    def _stratified_indexes(items: List[Any], max_items: int) -> List[int]:
+        # items are grouped by structure and picked in turn from every group, so rare variants are not lost
+        groups = {}
+        for index, item in enumerate(items):
+            groups.setdefault(SamplingPolicy._signature(item), []).append(index)
+        indexes = []
+        position = 0
+        while len(indexes) < max_items:
+            for group in groups.values():
+                if position < len(group) and len(indexes) < max_items:
+                    indexes.append(group[position])
+            position += 1
+        return sorted(indexes)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Container, Hashable
+
+REF_PREFIX = '#/components/schemas/'
+
+
+def unique_name(name: str, taken: Container[str]) -> str:
+    # deterministic suffixes: Name, Name2, Name3...
+    unique = name
+    counter = 2
+    while unique in taken:
+        unique = f'{name}{counter}'
+        counter += 1
+    return unique
+
+
+def rewrite_refs(item: Any, renames: Dict[str, str]) -> Any:
+    if isinstance(item, dict):
+        new_item = {}
+        for key, value in item.items():
+            if key == '$ref' and isinstance(value, str) and value.startswith(REF_PREFIX):
+                name = value[len(REF_PREFIX):]
+                new_item[key] = f'{REF_PREFIX}{renames.get(name, name)}'
+            else:
+                new_item[key] = rewrite_refs(value, renames)
+        return new_item
+    if isinstance(item, list):
+        return [rewrite_refs(value, renames) for value in item]
+    return item
+
+
+class SchemaRegistry:
+    def __init__(self):
+        self.schemas = {}
+        self._names_by_shape = {}
+
+    @staticmethod
+    def _shape_key(schema: Dict[str, Any]) -> str:
+        return hashlib.sha1(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+    def intern(self, name: str, schema: Dict[str, Any]) -> str:
+        # the same shape is always stored once, under the name it was first seen with
+        shape_key = SchemaRegistry._shape_key(schema)
+        interned_name = self._names_by_shape.get(shape_key)
+        if interned_name is None:
+            interned_name = unique_name(name, self.schemas)
+            self.schemas[interned_name] = schema
+            self._names_by_shape[shape_key] = interned_name
+        return interned_name
+
+    def merge(self, schemas: Dict[str, Any]) -> Dict[str, str]:
+        # schemas are listed after the subschemas they reference, so every reference can be renamed
+        # before the shape of the schema is hashed
+        renames = {}
+        for name, schema in schemas.items():
+            renames[name] = self.intern(name, rewrite_refs(schema, renames))
+        return renames
+
+
+def content_hash(value: Any) -> str:
+    # the key order is kept, it is the order of the properties of the schemas
+    return hashlib.sha1(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode()).hexdigest()
+
+
+# Components already inferred for a response, by the request it answered and the hash of its content. Endpoints
+# sending the same request get the same response, only the prefix of their component names differs: every name is
+# the prefix followed by a suffix, unique among the names of the same response, so the names are renamed instead
+# of inferred again. The entries hold only the schemas, never the responses, so that these are released as soon
+# as their endpoint is built
+class SchemaMemo:
+    DEFAULT_SIZE = 1024
+
+    def __init__(self, size: int = DEFAULT_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+
+    def components(self,
+                   key: Hashable,
+                   prefix: str,
+                   build: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            schemas = build()
+            self._entries[key] = prefix, rewrite_refs(schemas, {})
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+            return schemas
+        self._entries.move_to_end(key)
+        memo_prefix, memo_schemas = entry
+        renames = {name: f'{prefix}{name[len(memo_prefix):]}' for name in memo_schemas}
+        return {renames[name]: rewrite_refs(schema, renames) for name, schema in memo_schemas.items()}
@@ -0,0 +1,84 @@
+import os
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple, Union
+
+from .emitter import FORMAT_YAML
+from .metrics import RunMetrics
+from .pipeline import GenerationPipeline
+
+
+# Polls the size and modification time of the files, portable and cheap for the couple of files of a collection.
+# A change is reported once the files have stayed the same for the debounce time, so that an editor saving in
+# many writes triggers one run only
+class FileWatcher:
+    DEFAULT_INTERVAL = 0.2
+    DEFAULT_DEBOUNCE = 0.3
+
+    def __init__(self,
+                 paths: List[Union[str, Path]],
+                 *,
+                 interval: float = DEFAULT_INTERVAL,
+                 debounce: float = DEFAULT_DEBOUNCE):
+        self.paths = [Path(path) for path in paths]
+        self.interval = interval
+        self.debounce = debounce
+        self._snapshot = self.snapshot()
+
+    def snapshot(self) -> Tuple:
+        stats = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # a file replaced by the editor can be missing for a moment
+                stats.append(None)
+                continue
+            stats.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(stats)
+
+    def wait(self):
+        # blocks until a change has settled
+        while True:
+            time.sleep(self.interval)
+            snapshot = self.snapshot()
+            if snapshot == self._snapshot:
+                continue
+            changed = time.monotonic()
+            while time.monotonic() - changed < self.debounce:
+                time.sleep(min(self.interval, self.debounce))
+                current = self.snapshot()
+                if current != snapshot:
+                    snapshot = current
+                    changed = time.monotonic()
+            self._snapshot = snapshot
+            if None not in snapshot:
+                return
+
+
+def watch(pipeline: GenerationPipeline,
+          watcher: FileWatcher,
+          output_path: Path,
+          output_format: str = FORMAT_YAML,
+          incremental: bool = False,
+          runs: Union[int, None] = None,
+          after_run: Union[Callable[[GenerationPipeline], None], None] = None):
+    # generates the openapi doc now and again on every change of the watched files, the pipeline must keep its
+    # state alive between the runs. A failed run, e.g. on a collection saved half written, is reported and the
+    # next change is waited for
+    completed = 0
+    while runs is None or completed < runs:
+        if completed:
+            watcher.wait()
+        pipeline.metrics = RunMetrics()
+        start = time.perf_counter()
+        try:
+            written = pipeline.run(output_path, output_format, incremental, only_if_changed=True)
+        except Exception as e:
+            print(f'ERROR: generation failed ---> {e}')
+        else:
+            seconds = time.perf_counter() - start
+            print(f'{output_path} {"written" if written else "unchanged"} in {seconds:.3f}s')
+            if after_run is not None:
+                after_run(pipeline)
+        completed += 1
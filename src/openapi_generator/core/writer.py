@@ -0,0 +1,80 @@
+from typing import Any, Dict, List, Tuple, Union
+
+from .emitter import DocumentEmitter
+from .incremental import IncrementalState
+from .schemas import SchemaRegistry, rewrite_refs
+
+
+def rename_operation_refs(operation: Dict[str, Any], renames: Dict[str, str]) -> Dict[str, Any]:
+    # only the schemas are rewritten, examples can be big and are left untouched
+    if all(name == new_name for name, new_name in renames.items()):
+        return operation
+    operation = dict(operation)
+    contents = []
+    if 'requestBody' in operation:
+        operation['requestBody'] = dict(operation['requestBody'])
+        contents.append(operation['requestBody'])
+    if 'responses' in operation:
+        operation['responses'] = {code: dict(response) for code, response in operation['responses'].items()}
+        contents.extend(operation['responses'].values())
+    for content in contents:
+        if 'content' in content:
+            content['content'] = {media_type: dict(media, schema=rewrite_refs(media['schema'], renames))
+                                  if 'schema' in media else media
+                                  for media_type, media in content['content'].items()}
+    return operation
+
+
+# Writes the operations of the endpoints in a deterministic order whatever the order they are built in:
+# the paths follow their first appearance in the endpoint list, and a path is emitted, and its operations
+# released, as soon as all its endpoints are available and all the paths before it have been emitted
+class DocumentWriter:
+    def __init__(self,
+                 emitter: DocumentEmitter,
+                 endpoint_paths: List[Union[str, None]],
+                 state: Union[IncrementalState, None] = None):
+        self._emitter = emitter
+        self._state = state
+        # the same shape found in many endpoints becomes a single component
+        self._registry = SchemaRegistry()
+        self._groups = {}
+        for index, path in enumerate(endpoint_paths):
+            self._groups.setdefault(path, []).append(index)
+        self._group_order = list(self._groups)
+        self._next_group = 0
+        self._fragments = {}
+
+    def start(self, header: Dict[str, Any]):
+        self._emitter.start(header)
+
+    def add(self,
+            index: int,
+            method: Union[str, None],
+            fingerprint: Union[str, None],
+            fragment: Union[Tuple[Dict[str, Any], Dict[str, Any]], None]):
+        # fragment is None for the endpoints that could not be built
+        self._fragments[index] = (method, fingerprint, fragment)
+        self._flush()
+
+    def _flush(self):
+        while self._next_group < len(self._group_order):
+            path = self._group_order[self._next_group]
+            indexes = self._groups[path]
+            if any(index not in self._fragments for index in indexes):
+                return
+            path_item = {}
+            for index in indexes:
+                method, fingerprint, fragment = self._fragments.pop(index)
+                if fragment is None:
+                    continue
+                operation, endpoint_schemas = fragment
+                if self._state is not None and fingerprint:
+                    self._state.record(fingerprint, operation, endpoint_schemas)
+                renames = self._registry.merge(endpoint_schemas)
+                path_item[method] = rename_operation_refs(operation, renames)
+            if path_item:
+                self._emitter.write_path(path, path_item)
+            self._next_group += 1
+
+    def end(self):
+        self._emitter.end({"schemas": self._registry.schemas})
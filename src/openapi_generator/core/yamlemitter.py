@@ -0,0 +1,90 @@
+from typing import Any, Dict, TextIO
+
+import yaml
+from yaml.events import (DocumentEndEvent, DocumentStartEvent, MappingEndEvent, MappingStartEvent, ScalarEvent,
+                         SequenceEndEvent, SequenceStartEvent)
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
+
+from .emitter import DocumentEmitter
+
+try:
+    from yaml import CDumper as _BaseDumper
+except ImportError:
+    from yaml import Dumper as _BaseDumper
+
+
+def str_presenter(dumper, data):
+    if len(data.splitlines()) > 1:  # check for multiline string
+        return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='|')
+    return dumper.represent_scalar('tag:yaml.org,2002:str', data)
+
+
+# The representers of the openapi docs are added to this Dumper only, yaml.dump and the other Dumpers are left as
+# they are for the code importing the generator
+class OpenAPIDumper(_BaseDumper):
+    # the document is emitted in chunks, anchors could not be resolved across them
+    def ignore_aliases(self, data):
+        return True
+
+
+OpenAPIDumper.add_representer(str, str_presenter)
+
+
+def dump_yaml(data: Any) -> str:
+    return yaml.dump(data, Dumper=OpenAPIDumper, sort_keys=False)
+
+
+class YAMLEmitter(DocumentEmitter):
+    def __init__(self, stream: TextIO):
+        super().__init__(stream)
+        self._dumper = OpenAPIDumper(stream, sort_keys=False)
+
+    def _emit_node(self, node):
+        dumper = self._dumper
+        if isinstance(node, ScalarNode):
+            implicit = (node.tag == dumper.resolve(ScalarNode, node.value, (True, False)),
+                        node.tag == dumper.resolve(ScalarNode, node.value, (False, True)))
+            dumper.emit(ScalarEvent(None, node.tag, implicit, node.value, style=node.style))
+        elif isinstance(node, SequenceNode):
+            implicit = node.tag == dumper.resolve(SequenceNode, node.value, True)
+            dumper.emit(SequenceStartEvent(None, node.tag, implicit, flow_style=node.flow_style))
+            for item in node.value:
+                self._emit_node(item)
+            dumper.emit(SequenceEndEvent())
+        elif isinstance(node, MappingNode):
+            implicit = node.tag == dumper.resolve(MappingNode, node.value, True)
+            dumper.emit(MappingStartEvent(None, node.tag, implicit, flow_style=node.flow_style))
+            for key, value in node.value:
+                self._emit_node(key)
+                self._emit_node(value)
+            dumper.emit(MappingEndEvent())
+
+    def _emit_data(self, data: Any):
+        self._emit_node(self._dumper.represent_data(data))
+        # same cleanup of yaml representer after a whole document
+        self._dumper.represented_objects = {}
+        self._dumper.object_keeper = []
+        self._dumper.alias_key = None
+
+    def _emit_field(self, key: str, value: Any):
+        self._emit_data(key)
+        self._emit_data(value)
+
+    def start(self, header: Dict[str, Any]):
+        self._dumper.open()
+        self._dumper.emit(DocumentStartEvent())
+        self._dumper.emit(MappingStartEvent(None, None, True, flow_style=False))
+        for key, value in header.items():
+            self._emit_field(key, value)
+        self._emit_data('paths')
+        self._dumper.emit(MappingStartEvent(None, None, True, flow_style=False))
+
+    def write_path(self, path: str, path_item: Dict[str, Any]):
+        self._emit_field(path, path_item)
+
+    def end(self, components: Dict[str, Any]):
+        self._dumper.emit(MappingEndEvent())
+        self._emit_field('components', components)
+        self._dumper.emit(MappingEndEvent())
+        self._dumper.emit(DocumentEndEvent())
+        self._dumper.close()